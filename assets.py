@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from email.utils import parsedate_to_datetime
+
+# Not stored: the body is kept decoded, and cookies belong to the storage state
+DROPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'set-cookie'}
+
+
+class AssetCache:
+    def __init__(self, enabled=True, dir='.cache/assets', types=('script', 'stylesheet', 'font', 'image'),
+                 ttl_hours=24, max_mb=200):
+        """
+        Serve the scripts, stylesheets and other static assets of rendered
+        pages from disk across runs.
+
+        Every asset is kept with its validators. While fresh according to its
+        Cache-Control or Expires header, or for `ttl_hours` if it has
+        neither, it is served without a request. Once stale it is
+        revalidated with If-None-Match / If-Modified-Since and served from
+        disk on a 304, or on a network error.
+
+        Args:
+            enabled (bool): Cache assets at all
+            dir (str): Directory of the cached assets, shared by all sites
+            types (list): Playwright resource types to cache
+            ttl_hours (float): Freshness of an asset without caching headers
+            max_mb (float): Size the cache is pruned to after each cycle,
+                least recently used assets first
+        """
+        self.enabled = enabled
+        self.dir = dir
+        self.types = set(types or ())
+        self.ttl = ttl_hours * 3600
+        self.max_bytes = max_mb * 1024 * 1024
+
+    def _path(self, url):
+        return os.path.join(self.dir, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def _load(self, url):
+        """The cached entry of an asset with its body, None when it is not cached."""
+        path = self._path(url)
+        try:
+            with open(f"{path}.json", 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            with open(f"{path}.body", 'rb') as f:
+                entry['body'] = f.read()
+        except (OSError, ValueError):
+            return None
+        # Another URL with the same hash, however unlikely
+        return entry if entry.get('url') == url else None
+
+    def _save(self, url, status, headers, body, fresh_until):
+        os.makedirs(self.dir, exist_ok=True)
+        path = self._path(url)
+        entry = {'url': url, 'status': status, 'headers': headers, 'fresh_until': fresh_until}
+        # The body first, an entry is only found once its metadata exists
+        self._replace(f"{path}.body", body)
+        self._replace(f"{path}.json", json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+
+    def _replace(self, path, data):
+        # A temporary file of its own, the workers of a sharded run may cache the same asset at once
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _try_save(self, url, status, headers, body, fresh_until):
+        """Cache an asset, the page is served either way."""
+        try:
+            self._save(url, status, headers, body, fresh_until)
+        except OSError as e:
+            logging.warning(f"Failed to cache asset {url}: {str(e)}")
+
+    def _fresh_until(self, headers, now):
+        cache_control = headers.get('cache-control', '').lower()
+        if 'no-cache' in cache_control:
+            return now
+        max_age = re.search(r'max-age=(\d+)', cache_control)
+        if max_age:
+            return now + int(max_age.group(1))
+        if headers.get('expires'):
+            try:
+                return parsedate_to_datetime(headers['expires']).timestamp()
+            except (TypeError, ValueError):
+                return now
+        return now + self.ttl
+
+    async def attach(self, context, metrics):
+        """
+        Serve the cacheable requests of a context from the cache.
+
+        Args:
+            context (BrowserContext): The context of a rendered page
+            metrics (SiteMetrics): Counts the hits and misses of the site
+        """
+        if not self.enabled:
+            return
+
+        async def handle(route):
+            await self.handle(route, metrics)
+        await context.route("**/*", handle)
+
+    async def handle(self, route, metrics):
+        request = route.request
+        if request.method != 'GET' or request.resource_type not in self.types:
+            await route.fallback()
+            return
+
+        now = time.time()
+        entry = self._load(request.url)
+        if entry and entry['fresh_until'] > now:
+            metrics.asset_hits += 1
+            self._touch(request.url)
+            await route.fulfill(status=entry['status'], headers=entry['headers'], body=entry['body'])
+            return
+
+        request_headers = dict(request.headers)
+        if entry:
+            if entry['headers'].get('etag'):
+                request_headers['if-none-match'] = entry['headers']['etag']
+            if entry['headers'].get('last-modified'):
+                request_headers['if-modified-since'] = entry['headers']['last-modified']
+        try:
+            response = await route.fetch(headers=request_headers)
+        except Exception as e:
+            if entry:
+                # Better a stale copy than a page without its scripts
+                metrics.asset_hits += 1
+                await route.fulfill(status=entry['status'], headers=entry['headers'], body=entry['body'])
+            else:
+                logging.debug(f"Failed to fetch asset {request.url}: {str(e)}")
+                await route.abort()
+            return
+
+        if entry and response.status == 304:
+            metrics.asset_hits += 1
+            fresh_headers = {**entry['headers'], **{name: value for name, value in response.headers.items()
+                                                    if name in ('cache-control', 'expires', 'etag', 'last-modified')}}
+            self._try_save(request.url, entry['status'], fresh_headers, entry['body'],
+                           self._fresh_until(fresh_headers, now))
+            await route.fulfill(status=entry['status'], headers=fresh_headers, body=entry['body'])
+            return
+
+        metrics.asset_misses += 1
+        body = await response.body()
+        headers = {name: value for name, value in response.headers.items() if name not in DROPPED_HEADERS}
+        if response.status == 200 and 'no-store' not in headers.get('cache-control', '').lower():
+            self._try_save(request.url, response.status, headers, body, self._fresh_until(headers, now))
+        await route.fulfill(status=response.status, headers=headers, body=body)
+
+    def _touch(self, url):
+        try:
+            os.utime(f"{self._path(url)}.body")
+        except OSError:
+            pass
+
+    def prune(self):
+        """Delete the least recently used assets until the cache fits in max_mb."""
+        try:
+            stats = [(entry.path, entry.stat()) for entry in os.scandir(self.dir) if entry.name.endswith('.body')]
+        except OSError:
+            # Missing, or pruned by another process at the same time
+            return
+        total = sum(stat.st_size for _, stat in stats)
+        for path, stat in sorted(stats, key=lambda item: item[1].st_mtime):
+            if total <= self.max_bytes:
+                break
+            for name in (f"{path[:-len('.body')]}.json", path):
+                try:
+                    os.remove(name)
+                except OSError:
+                    pass
+            total -= stat.st_size
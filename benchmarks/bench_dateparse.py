@@ -0,0 +1,71 @@
+"""
+Compare DateParser with the dateutil fuzzy parse + localize it replaces.
+
+Usage:
+    python benchmarks/bench_dateparse.py [--rows 200] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz
+from dateutil.parser import parse
+
+from dateparse import DateParser
+
+# Date cells as they appear on the configured sites
+SAMPLES = [
+    '2025-04-23',
+    '2025/04/22',
+    '2025年4月21日',
+    '[04-18]',
+    '发布日期：2025-04-17',
+    '2025-04-16 10:30',
+]
+
+
+def dateutil_baseline(texts, timezone):
+    for text in texts:
+        try:
+            timezone.localize(parse(text, fuzzy=True))
+        except ValueError:
+            pass
+
+
+def date_parser(texts, parser):
+    for text in texts:
+        parser.parse(text)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--rows', type=int, default=200, help='date cells per simulated page')
+    arg_parser.add_argument('--repeat', type=int, default=20, help='pages parsed per measurement')
+    args = arg_parser.parse_args()
+
+    timezone = pytz.timezone('Asia/Shanghai')
+    texts = [SAMPLES[i % len(SAMPLES)] for i in range(args.rows)]
+    # Every row distinct, so the memo cannot help
+    unique = [f"2025-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}" for i in range(args.rows)]
+
+    cases = [
+        ('dateutil fuzzy', lambda: dateutil_baseline(texts, timezone)),
+        ('DateParser (memoized)', lambda: date_parser(texts, DateParser(timezone))),
+        ('dateutil fuzzy, unique', lambda: dateutil_baseline(unique, timezone)),
+        ('DateParser, unique', lambda: date_parser(unique, DateParser(timezone))),
+    ]
+    results = {}
+    for name, case in cases:
+        seconds = min(timeit.repeat(case, number=args.repeat, repeat=3)) / (args.repeat * args.rows)
+        results[name] = seconds
+        print(f"{name:<26} {seconds * 1e6:8.2f} us/date")
+
+    print(f"speedup, site-like rows: {results['dateutil fuzzy'] / results['DateParser (memoized)']:.1f}x")
+    print(f"speedup, unique rows:    {results['dateutil fuzzy, unique'] / results['DateParser, unique']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Compare the streaming RSSWriter with the feedgen serialization it replaces.
+
+Usage:
+    python benchmarks/bench_feedwriter.py [--sizes 100 10000 100000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz
+from feedgen.feed import FeedGenerator
+
+from feedwriter import Channel, RSSWriter
+
+URL = "https://gdstc.gd.gov.cn/zwgk_n/tzgg/index.html"
+
+
+def make_entries(count):
+    """(date, title, link) tuples, newest first, as EntryStore.latest returns them."""
+    timezone = pytz.timezone('Asia/Shanghai')
+    start = timezone.localize(datetime(2025, 4, 23))
+    return [
+        (start - timedelta(hours=i),
+         f"广东省科学技术厅关于征集 2025 年度项目 & 专项指南建议的通知 <{i}>",
+         f"https://gdstc.gd.gov.cn/zwgk_n/tzgg/content/post_{4701196 - i}.html")
+        for i in range(count)
+    ]
+
+
+def with_feedgen(path, channel, entries):
+    # The previous RSS.gen_feed: a full object tree, serialized twice
+    fg = FeedGenerator()
+    fg.title(title=channel.title)
+    fg.link(href=channel.link)
+    fg.description(description=channel.description)
+    fg.language(channel.language)
+    fg.id(channel.link)
+    fg.lastBuildDate(channel.last_build)
+    for date, title, link in reversed(entries):
+        fe = fg.add_entry()
+        fe.title(title)
+        fe.link(href=link)
+        fe.guid(link)
+        fe.description(title)
+        fe.pubDate(date)
+    fg.rss_str(pretty=True)
+    fg.rss_file(path, pretty=True)
+
+
+def with_writer(path, channel, entries):
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        RSSWriter(f).write(channel, entries)
+
+
+def measure(func, path, channel, entries):
+    start = time.perf_counter()
+    func(path, channel, entries)
+    elapsed = time.perf_counter() - start
+    # tracemalloc slows allocations down, so memory is measured in a second run
+    tracemalloc.start()
+    func(path, channel, entries)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000])
+    args = parser.parse_args()
+
+    channel = Channel(
+        title="\xa0\xa0广东省科学技术厅",
+        link=URL,
+        description="广东省科学技术厅网站由广东省科学技术厅主办",
+        last_build=datetime(2025, 4, 25, 1, 55, 13, tzinfo=pytz.utc)
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path = os.path.join(tmp, 'feedgen.xml')
+        new_path = os.path.join(tmp, 'writer.xml')
+        print(f"{'items':>8} {'feedgen':>10} {'writer':>10} {'speedup':>8} {'feedgen peak':>13} {'writer peak':>12} {'identical':>9}")
+        for size in args.sizes:
+            entries = make_entries(size)
+            old_time, old_peak = measure(with_feedgen, old_path, channel, entries)
+            new_time, new_peak = measure(with_writer, new_path, channel, entries)
+            with open(old_path, 'rb') as old, open(new_path, 'rb') as new:
+                identical = old.read() == new.read()
+            print(f"{size:>8} {old_time:>9.3f}s {new_time:>9.3f}s {old_time / new_time:>7.1f}x "
+                  f"{old_peak / 2**20:>11.1f}MB {new_peak / 2**20:>10.1f}MB {str(identical):>9}")
+
+
+if __name__ == '__main__':
+    main()
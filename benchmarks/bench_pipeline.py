@@ -0,0 +1,364 @@
+"""
+Run the whole RSS.rss_builder pipeline offline against a local HTTP server.
+
+The server serves the snapshots in benchmarks/fixtures, one per site of
+config.yaml, and synthetic ul.list pages with any number of rows. Every case
+is crawled cold (empty state, the feed is written) and warm (state of the
+cold run, the unchanged content is skipped), both with a plain HTTP fetch and
+rendered in Chromium. The render cases are skipped when Chromium cannot be
+launched.
+
+Timings depend on the machine, so baselines are saved locally and not
+committed. Comparing with a baseline from another platform or Python version
+only prints the differences.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--rows 10 100 1000 10000] [--repeat 5]
+    python benchmarks/bench_pipeline.py --save benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --compare benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py --no-render
+    python benchmarks/bench_pipeline.py --record
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import yaml
+
+from browser import BrowserSession
+from crawler import Crawler
+from extract import extract_static
+from fetch import fetch
+from main import RSS, Selector
+from readiness import Readiness
+
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+SYNTHETIC_SELECTOR = {'container': 'ul.list li', 'link': 'a', 'title': 'a', 'date': 'span.time'}
+
+
+def config_sites():
+    with open(os.path.join(ROOT, 'config.yaml'), 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f).get('sites', [])
+
+
+def fixture_name(site):
+    return os.path.splitext(os.path.basename(site['output_file']))[0]
+
+
+def synthetic_page(rows):
+    items = ''.join(
+        f'<li><a href="content/post_{1000000 - i}.html">关于组织申报2025年度科技计划项目的通知 第{i}号</a>'
+        f'<span class="time">2025-{1 + i // 28 % 12:02d}-{1 + i % 28:02d}</span></li>\n'
+        for i in range(rows))
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Synthetic {rows}</title>'
+            f'<meta name="description" content="{rows} rows"></head>\n'
+            f'<body><ul class="list">\n{items}</ul></body></html>\n').encode('utf-8')
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    pages = {}
+
+    def do_GET(self):
+        body = self.load(urlparse(self.path).path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def load(self, path):
+        if path not in FixtureHandler.pages:
+            folder, _, name = path.strip('/').partition('/')
+            if folder == 'fixtures' and os.path.basename(name) == name:
+                try:
+                    with open(os.path.join(FIXTURES, name), 'rb') as f:
+                        FixtureHandler.pages[path] = f.read()
+                except OSError:
+                    return None
+            elif folder == 'synthetic' and name.endswith('.html') and name[:-5].isdigit():
+                FixtureHandler.pages[path] = synthetic_page(int(name[:-5]))
+            else:
+                return None
+        return FixtureHandler.pages[path]
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_cases(base_url, rows, render=True):
+    """(name, row count, site options) of every fixture and synthetic page, plain and rendered."""
+    cases = []
+    for site in config_sites():
+        name = fixture_name(site)
+        if os.path.exists(os.path.join(FIXTURES, f"{name}.html")):
+            cases.append((name, None, {
+                'url': f"{base_url}/fixtures/{name}.html",
+                'selector': site['selector'],
+                **{k: v for k, v in site.items() if k in ('timezone', 'date_formats')},
+            }))
+    for count in rows:
+        cases.append((f"synthetic-{count}", count, {
+            'url': f"{base_url}/synthetic/{count}.html",
+            'selector': SYNTHETIC_SELECTOR,
+        }))
+    if render:
+        # The 10,000 row page would only measure Chromium's layout
+        cases += [(f"{name}-render", count, {**options, 'render': True})
+                  for name, count, options in cases if count is None or count <= 1000]
+    return cases
+
+
+async def can_render(session):
+    """Whether Chromium can be launched here."""
+    try:
+        async with session.context():
+            return True
+    except Exception as e:
+        logging.warning(f"Chromium is not available, skipping the render cases: {str(e)}")
+        return False
+
+
+def reset_state(state_dir, max_items):
+    RSS.reset({
+        'state_dir': state_dir,
+        'feed': {'max_items': max_items, 'formats': ['rss']},
+        'metrics': {'jsonl': '', 'prometheus': ''},
+    })
+
+
+def make_site(options, output_dir, suffix=''):
+    rss = RSS(url=options['url'] + suffix,
+              output_file=os.path.join(output_dir, f"feed{suffix.replace('?copy=', '-')}.xml"),
+              **{k: v for k, v in options.items() if k not in ('url', 'selector')})
+    return rss, Selector(**options['selector'])
+
+
+def summarize(runs):
+    """Median total and phase timings of several SiteMetrics."""
+    phases = {}
+    for metrics in runs:
+        for phase, seconds in metrics.phases.items():
+            phases.setdefault(phase, []).append(seconds)
+    return {
+        'seconds': statistics.median(m.duration for m in runs),
+        'phases': {phase: statistics.median(values) for phase, values in phases.items()},
+        'status': runs[-1].status,
+    }
+
+
+async def bench_case(options, session, workdir, repeat, max_items):
+    cold, warm = [], []
+    for run in range(repeat):
+        run_dir = os.path.join(workdir, f"run{run}")
+        os.makedirs(run_dir)
+        reset_state(os.path.join(run_dir, 'state'), max_items)
+        rss, selector = make_site(options, run_dir)
+        await rss.rss_builder(selector, session)
+        cold.append(rss.metrics)
+        entries = rss.metrics.entries
+
+        rss, selector = make_site(options, run_dir)
+        await rss.rss_builder(selector, session)
+        warm.append(rss.metrics)
+    return {'entries': entries, 'cold': summarize(cold), 'warm': summarize(warm)}
+
+
+async def bench_throughput(cases, session, workdir, copies, concurrency, max_items):
+    """Sites per minute of full crawl cycles over copies of every case."""
+    reset_state(os.path.join(workdir, 'state'), max_items)
+    result = {'sites': len(cases) * copies}
+    for name, _, _ in cases:
+        os.makedirs(os.path.join(workdir, name))
+    for cycle in ('cold', 'warm'):
+        sites = [make_site(options, os.path.join(workdir, name), f"?copy={copy}")
+                 for copy in range(copies) for name, _, options in cases]
+        crawler = Crawler(session, concurrency=concurrency, per_host=concurrency)
+        start = time.monotonic()
+        results = await crawler.run(sites)
+        elapsed = time.monotonic() - start
+        result[f"{cycle}_sites_per_minute"] = len(sites) / elapsed * 60
+        result[f"{cycle}_failed"] = len(results) - sum(results)
+    return result
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB."""
+    try:
+        import resource
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+async def run_benchmarks(args):
+    server = start_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    cases = bench_cases(base_url, args.rows, args.render)
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'cases': {},
+    }
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            async with BrowserSession() as session:
+                if args.render and not await can_render(session):
+                    cases = [case for case in cases if not case[2].get('render')]
+                for name, rows, options in cases:
+                    workdir = os.path.join(tmp, name)
+                    results['cases'][name] = dict(
+                        rows=rows, **await bench_case(options, session, workdir, args.repeat, args.max_items))
+                fixture_cases = [case for case in cases
+                                 if not case[2].get('render') and (case[1] is None or case[1] <= 1000)]
+                results['throughput'] = await bench_throughput(
+                    fixture_cases, session, os.path.join(tmp, 'throughput'),
+                    args.copies, args.concurrency, args.max_items)
+            reset_state(tmp, args.max_items)
+    finally:
+        server.shutdown()
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def print_results(results):
+    print(f"{'case':<24} {'entries':>7} {'cold':>9} {'warm':>9}  cold phases")
+    for name, case in results['cases'].items():
+        phases = ', '.join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in case['cold']['phases'].items())
+        print(f"{name:<24} {case['entries']:>7} {case['cold']['seconds'] * 1000:>7.1f}ms "
+              f"{case['warm']['seconds'] * 1000:>7.1f}ms  {phases}")
+    throughput = results['throughput']
+    print(f"throughput over {throughput['sites']} sites: {throughput['cold_sites_per_minute']:.0f} sites/min cold, "
+          f"{throughput['warm_sites_per_minute']:.0f} sites/min warm")
+    print(f"peak RSS: {results['peak_rss_mb']:.1f}MB")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the change against a baseline.
+
+    Returns:
+        bool: Whether anything got slower by more than the tolerance, always
+            False against a baseline of another platform or Python version
+    """
+    regressed = False
+    comparable = all(baseline.get(key) == results[key] for key in ('platform', 'python'))
+    if not comparable:
+        print(f"Baseline from {baseline.get('platform')} (Python {baseline.get('python')}), "
+              f"running on {results['platform']} (Python {results['python']}): "
+              f"the timings are not comparable, regressions are only reported")
+
+    def check(label, old, new, higher_is_better=False):
+        nonlocal regressed
+        if not old or not new:
+            return
+        ratio = old / new if higher_is_better else new / old
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f"{label:<40} {old:>12.4g} {new:>12.4g} {ratio:>7.2f}x{flag}")
+
+    print(f"{'':<40} {'baseline':>12} {'current':>12} {'cost':>8}")
+    for name, case in results['cases'].items():
+        old = baseline.get('cases', {}).get(name)
+        if old:
+            check(f"{name} cold seconds", old['cold']['seconds'], case['cold']['seconds'])
+            check(f"{name} warm seconds", old['warm']['seconds'], case['warm']['seconds'])
+    for key in ('cold_sites_per_minute', 'warm_sites_per_minute'):
+        check(key, baseline.get('throughput', {}).get(key), results['throughput'][key], higher_is_better=True)
+    check('peak_rss_mb', baseline.get('peak_rss_mb'), results['peak_rss_mb'])
+    return regressed and comparable
+
+
+async def record():
+    """Replace the fixtures with snapshots of the live config.yaml sites."""
+    os.makedirs(FIXTURES, exist_ok=True)
+    async with BrowserSession() as session:
+        for site in config_sites():
+            path = os.path.join(FIXTURES, f"{fixture_name(site)}.html")
+            selector = Selector(**site['selector'])
+            response = await asyncio.to_thread(fetch, site['url'])
+            if response.ok and not site.get('render') and \
+                    extract_static(response.body, selector, response.charset)['entries']:
+                body = response.body
+            else:
+                # The list is built by scripts, keep the rendered DOM instead
+                readiness = Readiness(**site.get('readiness', {}))
+                async with session.context() as context:
+                    page = await context.new_page()
+                    await page.goto(site['url'], wait_until=readiness.wait_until)
+                    await readiness.wait(page, selector.container)
+                    html = await page.content()
+                body = html.replace('<head>', '<head><meta charset="utf-8">', 1).encode('utf-8')
+            with open(path, 'wb') as f:
+                f.write(body)
+            print(f"Recorded {site['url']} to {path} ({len(body) / 1024:.1f}KB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='rows of the synthetic pages')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case, the median is reported')
+    parser.add_argument('--copies', type=int, default=10, help='copies of each page in the throughput cycle')
+    parser.add_argument('--concurrency', type=int, default=4, help='sites crawled at the same time')
+    parser.add_argument('--max-items', type=int, default=100, help='entries per feed')
+    parser.add_argument('--no-render', dest='render', action='store_false', help='skip the Chromium render cases')
+    parser.add_argument('--save', metavar='JSON', help='write the results as a baseline')
+    parser.add_argument('--compare', metavar='JSON', help='compare with a saved baseline, exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against the baseline')
+    parser.add_argument('--record', action='store_true', help='re-record the fixtures from the live sites')
+    parser.add_argument('--verbose', action='store_true', help='keep the crawler log output')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if args.record:
+        asyncio.run(record())
+        return
+
+    results = asyncio.run(run_benchmarks(args))
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"Saved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
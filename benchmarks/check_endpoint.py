@@ -0,0 +1,81 @@
+"""
+Check Endpoint.discover against recorded API shapes.
+
+Every file in benchmarks/fixtures/api holds the rows extracted from a list
+page, the JSON responses its scripts fetched, and the mapping discovery
+has to find in them (null when it must find none). The discovered mapping
+is compared with the expected one, and the rows it produces from the
+response must link to the same articles on the same days as the page.
+
+Usage:
+    python benchmarks/check_endpoint.py [--verbose]
+"""
+import argparse
+import json
+import os
+import sys
+from urllib.parse import urljoin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dateparse import DateParser
+from endpoint import Endpoint
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'api')
+
+
+def check(case, date_parser):
+    """
+    Returns:
+        list: What differs from the expectation, empty when the case passes
+    """
+    responses = [tuple(response) for response in case['responses']]
+    endpoint = Endpoint.discover(responses, case['rows'], case['page_url'], date_parser)
+    found = endpoint.to_dict() if endpoint else None
+    if found != case['expected']:
+        return [f"expected {case['expected']}, discovered {found}"]
+    if endpoint is None:
+        return []
+
+    data = dict(responses)[endpoint.url]
+    rows = endpoint.rows(data, date_parser.timezone)
+    problems = []
+    if len(rows) != len(case['rows']):
+        problems.append(f"{len(rows)} rows from the API, {len(case['rows'])} on the page")
+    for api_row, page_row in zip(rows, case['rows']):
+        link = urljoin(case['page_url'], page_row['href'])
+        if urljoin(case['page_url'], api_row['href']) != link:
+            problems.append(f"link {api_row['href']} instead of {link}")
+        if endpoint.date:
+            api_date = date_parser.parse(api_row['date'])
+            page_date = date_parser.parse(page_row['date'])
+            if api_date is None or api_date.date() != page_date.date():
+                problems.append(f"date {api_row['date']} instead of {page_row['date']} for {link}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help='print the discovered mappings')
+    args = parser.parse_args()
+
+    date_parser = DateParser('Asia/Shanghai')
+    failed = 0
+    for name in sorted(os.listdir(FIXTURES)):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as f:
+            case = json.load(f)
+        problems = check(case, date_parser)
+        print(f"{'FAIL' if problems else 'ok':<4} {name}: {case['description']}")
+        if args.verbose and not problems:
+            print(f"     {case['expected']}")
+        for problem in problems:
+            print(f"     {problem}")
+        failed += bool(problems)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
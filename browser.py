@@ -0,0 +1,205 @@
+import asyncio
+import ipaddress
+import logging
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+from playwright.async_api import async_playwright
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Second-level domains under which the registrable domain has three labels
+GENERIC_SLDS = {'com.cn', 'net.cn', 'org.cn', 'gov.cn', 'edu.cn', 'ac.cn'}
+
+
+def site_domain(host):
+    """Registrable part of a host name, e.g. gd.gov.cn for gdstc.gd.gov.cn."""
+    host = (host or '').lower().rstrip('.')
+    try:
+        return str(ipaddress.ip_address(host))
+    except ValueError:
+        pass
+    labels = host.split('.')
+    size = 3 if '.'.join(labels[-2:]) in GENERIC_SLDS else 2
+    return '.'.join(labels[-size:])
+
+
+class BrowserSession:
+    launch_args = [
+        "--disable-blink-features=AutomationControlled",
+        "--disable-dev-shm-usage",
+        "--no-sandbox",
+        "--dns-prefetch-disable",
+    ]
+
+    def __init__(self, max_pages=50, max_memory_mb=1024):
+        """
+        Initialize a shared Chromium session.
+
+        The browser is launched lazily on the first context and relaunched
+        once it has served `max_pages` pages or the browser processes use
+        more than `max_memory_mb` of resident memory. Recycling waits until
+        every open context has been released.
+
+        Args:
+            max_pages (int): Pages served before the browser is recycled, 0 to disable
+            max_memory_mb (int): Memory limit in MB before recycling, 0 to disable
+        """
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        if max_memory_mb and psutil is None:
+            logging.warning("psutil is not installed, browser.max_memory_mb has no effect")
+        self.playwright = None
+        self.browser = None
+        self.pages = 0
+        self.active = 0
+        self.condition = asyncio.Condition()
+        self.launches = 0
+        self.launch_seconds = 0.0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        start = time.monotonic()
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(
+            headless=True,
+            args=BrowserSession.launch_args
+        )
+        self.pages = 0
+        elapsed = time.monotonic() - start
+        self.launches += 1
+        self.launch_seconds += elapsed
+        logging.info(f"Launched Chromium in {elapsed:.2f}s")
+
+    @asynccontextmanager
+    async def context(self, **kwargs):
+        """Yield a fresh BrowserContext on the shared browser and close it afterwards."""
+        context = await self.new_context(**kwargs)
+        try:
+            yield context
+        finally:
+            await self.release(context)
+
+    async def new_context(self, **kwargs):
+        """Return a fresh BrowserContext, recycling the browser first if due."""
+        async with self.condition:
+            if self.browser is not None and self._should_recycle():
+                await self.condition.wait_for(lambda: self.active == 0)
+                # Another waiter may already have recycled the browser
+                if self.browser is not None and self._should_recycle():
+                    await self.recycle()
+            if self.browser is None or not self.browser.is_connected():
+                await self.start()
+            self.pages += 1
+            self.active += 1
+        try:
+            return await self.browser.new_context(**kwargs)
+        except:
+            await self._release_slot()
+            raise
+
+    async def release(self, context):
+        try:
+            await context.close()
+        except:
+            pass
+        await self._release_slot()
+
+    async def recycle(self):
+        logging.info(f"Recycling Chromium after {self.pages} pages")
+        await self._close_browser()
+
+    async def close(self):
+        await self._close_browser()
+        if self.playwright:
+            try:
+                await self.playwright.stop()
+            except:
+                pass
+            self.playwright = None
+
+    def memory_mb(self):
+        """Resident memory of the browser processes in MB, or None without psutil."""
+        if psutil is None:
+            return None
+        total = 0
+        for child in psutil.Process().children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / (1024 * 1024)
+
+    def _should_recycle(self):
+        if self.max_pages and self.pages >= self.max_pages:
+            return True
+        if self.max_memory_mb:
+            memory = self.memory_mb()
+            if memory is not None and memory > self.max_memory_mb:
+                logging.info(f"Chromium memory {memory:.0f}MB exceeds {self.max_memory_mb}MB")
+                return True
+        return False
+
+    async def _release_slot(self):
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    async def _close_browser(self):
+        if self.browser:
+            try:
+                await self.browser.close()
+            except:
+                pass
+            self.browser = None
+
+
+class ResourcePolicy:
+    def __init__(self, url, block_types=('image', 'media', 'font'), block_third_party=True, allow_hosts=()):
+        """
+        Decide which requests of a page are loaded while crawling a site.
+
+        Args:
+            url (str): The URL of the site, its domain counts as first party
+            block_types (list): Playwright resource types to abort, e.g. image, font
+            block_third_party (bool): Abort requests to other domains
+            allow_hosts (list): Hosts that are always loaded, e.g. a third-party
+                API the list is fetched from over XHR
+        """
+        self.domain = site_domain(urlparse(url).hostname)
+        self.block_types = set(block_types or ())
+        self.block_third_party = block_third_party
+        self.allow_hosts = set(allow_hosts or ())
+        self.blocked = 0
+
+    async def attach(self, context):
+        await context.route("**/*", self.handle)
+
+    def allows(self, request):
+        if request.resource_type == 'document' and request.frame.parent_frame is None:
+            return True
+        host = urlparse(request.url).hostname
+        if host in self.allow_hosts:
+            return True
+        if request.resource_type in self.block_types:
+            return False
+        if self.block_third_party and site_domain(host) != self.domain:
+            return False
+        return True
+
+    async def handle(self, route):
+        if self.allows(route.request):
+            # Hands the request to earlier routes, e.g. a replayed HAR, or the network
+            await route.fallback()
+        else:
+            self.blocked += 1
+            await route.abort()
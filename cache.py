@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class SiteCache:
+    def __init__(self, path):
+        """
+        Initialize a per-site cache persisted in SQLite.
+
+        Holds the HTTP validators (ETag, Last-Modified) and the fingerprint of
+        the last extracted content for every site URL, one row per site.
+        Several processes may share the database: a read sees the latest
+        committed state, and every update is merged into it in a write
+        transaction of its own, so a cycle costs a few single-row reads and
+        writes per site however many sites there are.
+
+        Args:
+            path (str): The SQLite database file
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        # Transactions are begun explicitly, see _transaction
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock before the read of a read-modify-write
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def get(self, url):
+        row = self.conn.execute("SELECT value FROM state WHERE key = ?", (url,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def update(self, url, **values):
+        """Merge values into the entry of a site."""
+        with self._transaction():
+            # Keep what other processes wrote since the last read
+            entry = {**self.get(url), **values}
+            self.conn.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                (url, json.dumps(entry, ensure_ascii=False))
+            )
+
+    @staticmethod
+    def fingerprint(content):
+        """Stable hash of extracted page content."""
+        data = json.dumps(content, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
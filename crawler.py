@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlparse
+
+from fetch import HTTPStatusError
+from metrics import SiteMetrics
+
+
+class CircuitBreaker:
+    def __init__(self, cache, threshold=3, cooldown_minutes=30):
+        """
+        Stop crawling a host after repeated failures, for a cooldown period.
+
+        A host opens after `threshold` sites on it failed in a row, each
+        after all its attempts. Once the cooldown is over the next site is
+        tried again; a success closes the host, a failure opens it for another
+        cooldown. Client errors (4xx) do not count, the host did answer.
+
+        Args:
+            cache (SiteCache): Where the state of every host is kept across runs
+            threshold (int): Consecutive failed sites that open a host
+            cooldown_minutes (float): How long an open host is skipped
+        """
+        self.cache = cache
+        self.threshold = threshold
+        self.cooldown = cooldown_minutes * 60
+
+    def allows(self, host):
+        return self.cache.get(host).get('open_until', 0) <= time.time()
+
+    def success(self, host):
+        if self.cache.get(host).get('failures'):
+            self.cache.update(host, failures=0, open_until=0)
+
+    def failure(self, host):
+        failures = self.cache.get(host).get('failures', 0) + 1
+        if failures >= self.threshold:
+            logging.warning(f"{host} failed {failures} times in a row, skipping it for {self.cooldown / 60:.0f} minutes")
+            self.cache.update(host, failures=failures, open_until=time.time() + self.cooldown)
+        else:
+            self.cache.update(host, failures=failures)
+
+
+class Crawler:
+    def __init__(self, session, concurrency=4, per_host=1, retries=3, retry_delay=5, exporter=None, breaker=None):
+        """
+        Initialize a crawler that builds several feeds at once on one browser.
+
+        Args:
+            session (BrowserSession): Browser shared by every site of the cycle
+            concurrency (int): Maximum number of sites crawled at the same time
+            per_host (int): Maximum number of sites crawled at the same time on one host
+            retries (int): Attempts per site before it fails
+            retry_delay (float): Seconds before the second attempt, doubled for each further one
+            exporter (MetricsExporter): Receives the metrics of every cycle
+            breaker (CircuitBreaker): Skips hosts that keep failing
+        """
+        self.session = session
+        self.exporter = exporter
+        self.breaker = breaker
+        self.per_host = per_host
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.host_semaphores = {}
+        self.cutoff = None
+
+    async def run(self, sites, budget=None):
+        """
+        Build every feed in the sites list concurrently.
+
+        Sites get their slots in list order, so the list is the priority
+        order. Once the budget is spent no further site is started: the
+        remaining ones are deferred, the ones already running finish.
+
+        Args:
+            sites: List of (RSS, Selector) tuples to process, most urgent first
+            budget (float): Seconds after which no site is started, unlimited by default
+
+        Returns:
+            list: One entry per site, True if the feed was built
+        """
+        start = time.monotonic()
+        self.cutoff = start + budget if budget else None
+        launches, launch_seconds = self.session.launches, self.session.launch_seconds
+        results = await asyncio.gather(
+            *(self.crawl_site(rss, selector) for rss, selector in sites))
+        duration = time.monotonic() - start
+        deferred = [rss.url for rss, _ in sites if rss.metrics.status == 'deferred']
+        missed = [rss.url for rss, _ in sites if rss.metrics.sla_missed]
+        logging.info(
+            f"Processed {sum(results)}/{len(results)} sites in {duration:.1f}s")
+        if deferred:
+            logging.warning(f"Cycle budget spent, {len(deferred)} sites carried over to the next cycle")
+        if missed:
+            logging.warning(f"{len(missed)} sites missed their SLA: {', '.join(missed)}")
+        if self.exporter:
+            cycle = {
+                'duration': duration,
+                'sites': len(results),
+                'failed': sum(rss.metrics.status == 'failed' for rss, _ in sites),
+                'deferred': len(deferred),
+                'sla_missed': len(missed),
+                'asset_hits': sum(rss.metrics.asset_hits for rss, _ in sites),
+                'asset_misses': sum(rss.metrics.asset_misses for rss, _ in sites),
+                'browser_launches': self.session.launches - launches,
+                'browser_launch_seconds': self.session.launch_seconds - launch_seconds,
+                'browser_memory_mb': self.session.memory_mb(),
+            }
+            try:
+                self.exporter.export([rss.metrics for rss, _ in sites], cycle)
+            except Exception as e:
+                logging.error(f"Failed to export metrics: {str(e)}")
+        return results
+
+    async def crawl_site(self, rss, selector):
+        built = await self._crawl_site(rss, selector)
+        if rss.sla_deadline is not None:
+            # Late whether it was built after its deadline or is still not built past it
+            rss.metrics.sla_missed = time.time() > rss.sla_deadline
+        return built
+
+    async def _crawl_site(self, rss, selector):
+        # Keyed by host and port, another service on the same machine may be fine
+        host = urlparse(rss.url).netloc
+        for attempt in range(self.retries):
+            if self.breaker and not self.breaker.allows(host):
+                logging.warning(f"Skipping {rss.url}: {host} is unavailable, keeping its last feed")
+                rss.metrics = SiteMetrics(rss.url)
+                rss.metrics.finish('skipped')
+                return False
+
+            # Take the host slot first so a busy host does not hold a global slot while waiting
+            async with self._host_semaphore(rss.url), self.semaphore:
+                if self.cutoff is not None and time.monotonic() >= self.cutoff:
+                    rss.metrics = SiteMetrics(rss.url)
+                    rss.metrics.finish('deferred')
+                    return False
+                try:
+                    await rss.rss_builder(selector, self.session)
+                    rss.metrics.retries = attempt
+                    if self.breaker:
+                        self.breaker.success(host)
+                    logging.info(f"Successfully processed {rss.title} ({rss.url})")
+                    return True
+                except Exception as e:
+                    error = e
+            rss.metrics.retries = attempt
+
+            if isinstance(error, HTTPStatusError) and not error.retryable:
+                logging.error(f"Failed to process {rss.title} ({rss.url}): {str(error)}, not retrying")
+                if self.breaker:
+                    self.breaker.success(host)
+                return False
+            if attempt == self.retries - 1:
+                logging.error(f"Failed to process {rss.title} ({rss.url}) after {self.retries} attempts: {str(error)}")
+                if self.breaker:
+                    self.breaker.failure(host)
+                return False
+
+            # Requeued with exponential backoff, its slots are free for other sites meanwhile
+            delay = self.retry_delay * 2 ** attempt
+            logging.warning(
+                f"Attempt {attempt + 1}/{self.retries} failed for {rss.url}: {str(error)}, retrying in {delay:g}s")
+            await asyncio.sleep(delay)
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).hostname
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self.host_semaphores[host]
@@ -0,0 +1,170 @@
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+import pytz
+from dateutil.parser import parse as dateutil_parse
+
+# 2025-04-23, 2025/4/23, 2025.04.23, 2025年4月23日, optionally followed by a time,
+# also ISO 8601 such as 2025-04-23T10:30:00.123+08:00 or 2024-12-31T16:00:00Z
+FULL_DATE = re.compile(
+    r'(?<!\d)(\d{4})\s*[-/.年]\s*(\d{1,2})\s*[-/.月]\s*(\d{1,2})(?!\d)\s*日?'
+    r'(?:(?:T|\s*)(\d{1,2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?\s*(Z|[+-]\d{2}:?\d{2})?)?')
+# 04-23, [04-23], 4月23日, 04.23, the year is inferred
+SHORT_DATE = re.compile(
+    r'(?<!\d)(\d{1,2})\s*([-/.月])\s*(\d{1,2})(?!\d)\s*日?'
+    r'(?:\s*(\d{1,2}):(\d{2})(?::(\d{2}))?)?')
+# A time following 昨天 or 今天
+TIME = re.compile(r'(\d{1,2}):(\d{2})(?::(\d{2}))?')
+# 1.5 or 3.14 is a number, not a date
+NUMBER = re.compile(r'\d+(?:\.\d+)?')
+# 3天前, 2 小时前
+RELATIVE_DATE = re.compile(r'(\d+)\s*(秒|分钟|分|小时|天|日|周|星期)前')
+RELATIVE_UNITS = {
+    '秒': timedelta(seconds=1),
+    '分钟': timedelta(minutes=1),
+    '分': timedelta(minutes=1),
+    '小时': timedelta(hours=1),
+    '天': timedelta(days=1),
+    '日': timedelta(days=1),
+    '周': timedelta(weeks=1),
+    '星期': timedelta(weeks=1),
+}
+RELATIVE_DAYS = {'今天': 0, '昨天': 1, '前天': 2}
+# Units whose dates only name the day, kept at midnight so they do not drift between runs
+DAY_UNITS = {'天', '日', '周', '星期'}
+
+
+class DateParser:
+    def __init__(self, timezone='Asia/Shanghai', formats=None, cache_size=4096):
+        """
+        Initialize a parser for the publication dates of a site.
+
+        Absolute dates are tried against the site's own strptime formats,
+        then against precompiled patterns for the formats the sites use, and
+        only then handed to dateutil's fuzzy parser. Their results are
+        memoized per day. Relative dates such as 3天前 are never cached.
+
+        Args:
+            timezone (str or tzinfo): Timezone of the dates on the site
+            formats (list): strptime formats tried first
+            cache_size (int): Number of memoized date strings
+        """
+        self.timezone = pytz.timezone(timezone) if isinstance(timezone, str) else timezone
+        self.formats = list(formats or [])
+        self._absolute = lru_cache(maxsize=cache_size)(self._parse_absolute)
+        self._tzinfo = lru_cache(maxsize=cache_size)(lambda hour: self.timezone.localize(hour).tzinfo)
+
+    def parse(self, text, now=None):
+        """
+        Parse a date string.
+
+        Args:
+            text (str): The date as shown on the page
+            now (datetime): Reference time for relative dates and inferred years
+
+        Returns:
+            datetime: Timezone-aware datetime, or None if the string is not a date
+        """
+        text = text.strip()
+        now = now.astimezone(self.timezone) if now else datetime.now(self.timezone)
+
+        if '前' in text or '今天' in text or '昨天' in text or '刚刚' in text:
+            relative = self._parse_relative(text, now)
+            if relative is not None:
+                return relative
+
+        return self._absolute(text, now.date())
+
+    def _parse_relative(self, text, now):
+        match = RELATIVE_DATE.search(text)
+        if match:
+            date = now - int(match.group(1)) * RELATIVE_UNITS[match.group(2)]
+            if match.group(2) in DAY_UNITS:
+                return self._midnight(date)
+            return date
+        if '刚刚' in text:
+            return now
+        for word, days in RELATIVE_DAYS.items():
+            if word in text:
+                day = self._midnight(now - timedelta(days=days))
+                time = TIME.search(text)
+                if time:
+                    hour, minute, second = time.groups()
+                    day = self._localize(day.replace(tzinfo=None, hour=int(hour), minute=int(minute),
+                                                     second=int(second or 0)))
+                return day
+        return None
+
+    def _midnight(self, date):
+        # Rebuild from the naive date so the UTC offset matches that day
+        return self._localize(date.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None))
+
+    def _parse_absolute(self, text, today):
+        naive = self._parse_naive(text, today)
+        return self._localize(naive) if naive else None
+
+    def _localize(self, naive):
+        # pytz's localize is slower than the parsing itself, so the resolved
+        # offset is reused for every date in the same hour
+        hour = naive.replace(minute=0, second=0, microsecond=0)
+        return naive.replace(tzinfo=self._tzinfo(hour))
+
+    def _parse_naive(self, text, today):
+        for fmt in self.formats:
+            try:
+                return datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+
+        match = FULL_DATE.search(text)
+        if match:
+            *fields, offset = match.groups()
+            try:
+                date = self._build(*fields)
+            except ValueError:
+                date = None
+            if date is not None and offset:
+                # An explicit offset wins over the site's timezone
+                date = date.replace(tzinfo=self._offset(offset)).astimezone(self.timezone).replace(tzinfo=None)
+            if date is not None:
+                return date
+
+        match = SHORT_DATE.search(text)
+        # 04.23 is a date, 1.5 is not
+        if match and (match.group(2) != '.' or len(match.group(1)) == len(match.group(3)) == 2):
+            month, _, day, hour, minute, second = match.groups()
+            try:
+                date = self._build(today.year, month, day, hour, minute, second)
+                # A month and day later than tomorrow belongs to last year
+                if date.date() > today + timedelta(days=1):
+                    date = date.replace(year=today.year - 1)
+                return date
+            except ValueError:
+                pass
+
+        if NUMBER.fullmatch(text):
+            logging.debug(f"Unparsable date: {text}")
+            return None
+        try:
+            date = dateutil_parse(text, fuzzy=True)
+            if date.tzinfo:
+                date = date.astimezone(self.timezone).replace(tzinfo=None)
+            return date
+        except (ValueError, OverflowError):
+            logging.debug(f"Unparsable date: {text}")
+            return None
+
+    @staticmethod
+    def _offset(text):
+        if text == 'Z':
+            return timezone.utc
+        sign = -1 if text[0] == '-' else 1
+        digits = text[1:].replace(':', '')
+        return timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
+
+    @staticmethod
+    def _build(year, month, day, hour=None, minute=None, second=None):
+        return datetime(int(year), int(month), int(day),
+                        int(hour or 0), int(minute or 0), int(second or 0))
@@ -0,0 +1,228 @@
+import re
+from datetime import datetime
+from urllib.parse import urljoin
+
+PLACEHOLDER = re.compile(r'\{([^{}]+)\}')
+
+
+def json_path(data, path):
+    """
+    Value at a dotted path in a JSON document, e.g. data.list or items.0.title.
+
+    Returns:
+        The value, None when the path does not exist
+    """
+    for key in path.split('.') if path else []:
+        if isinstance(data, list) and key.isdigit() and int(key) < len(data):
+            data = data[int(key)]
+        elif isinstance(data, dict) and key in data:
+            data = data[key]
+        else:
+            return None
+    return data
+
+
+def date_text(value, timezone):
+    """Text for DateParser from a JSON date, which may be a Unix time in seconds or milliseconds."""
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.isdigit() and len(value) in (10, 13):
+        value = int(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = value / 1000 if value > 1e11 else value
+        return datetime.fromtimestamp(seconds, timezone).strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+
+def _normalize(text):
+    return ' '.join(str(text).split())
+
+
+def _record_lists(data, path=''):
+    """Every non-empty list of objects in a JSON document, with its path."""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from _record_lists(value, f"{path}.{key}" if path else str(key))
+    elif isinstance(data, list):
+        if data and all(isinstance(item, dict) for item in data):
+            yield path, data
+        for index, item in enumerate(data):
+            yield from _record_lists(item, f"{path}.{index}" if path else str(index))
+
+
+def _fields(record, prefix=''):
+    """The scalar fields of a record by path, nested objects included."""
+    fields = {}
+    for key, value in record.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            fields.update(_fields(value, path))
+        elif not isinstance(value, list) and value is not None:
+            fields[path] = value
+    return fields
+
+
+def _title_matches(value, title):
+    value = _normalize(value)
+    if value == title:
+        return True
+    # Lists often shorten long titles, the API has them in full
+    shortened = title.rstrip('.…')
+    return shortened != title and len(shortened) >= 4 and value.startswith(shortened)
+
+
+class Endpoint:
+    def __init__(self, url, records, title, link=None, link_template=None, date=None):
+        """
+        The JSON API a page fills its list from, and where the entry fields
+        are in its response.
+
+        Paths are dotted keys and list indices into the JSON document, the
+        field paths are relative to a record.
+
+        Args:
+            url (str): URL of the API, fetched with a plain GET
+            records (str): Path of the list of records, empty for a top-level list
+            title (str): Path of the title in a record
+            link (str): Path of the link in a record, absolute or relative to the page
+            link_template (str): Link built from record fields when the API has
+                no link, e.g. /content/post_{id}.html
+            date (str): Path of the date in a record, text or a Unix time
+        """
+        if not (link or link_template):
+            raise ValueError("An endpoint needs a link or a link_template")
+        self.url = url
+        self.records = records
+        self.title = title
+        self.link = link
+        self.link_template = link_template
+        self.date = date
+
+    def to_dict(self):
+        return {key: value for key, value in vars(self).items() if value is not None}
+
+    def rows(self, data, timezone):
+        """
+        Turn an API response into the rows the page extraction returns.
+
+        Args:
+            data: The decoded JSON response
+            timezone (tzinfo): Timezone Unix times are shown in
+
+        Returns:
+            list: One dict per record with href, title and date, or error
+        """
+        records = json_path(data, self.records)
+        if not isinstance(records, list):
+            raise Exception(f"No list of records at '{self.records}' in {self.url}")
+        rows = []
+        for record in records:
+            title = json_path(record, self.title)
+            href = self._href(record)
+            if title is None or href is None:
+                rows.append({'error': f"No title or link in record of {self.url}"})
+                continue
+            rows.append({
+                'href': href,
+                'title': _normalize(title),
+                'date': date_text(json_path(record, self.date), timezone) if self.date else '',
+            })
+        return rows
+
+    def _href(self, record):
+        if self.link:
+            value = json_path(record, self.link)
+            return None if value is None else str(value)
+        values = {path: json_path(record, path) for path in PLACEHOLDER.findall(self.link_template)}
+        if any(value is None for value in values.values()):
+            return None
+        return PLACEHOLDER.sub(lambda m: str(values[m.group(1)]), self.link_template)
+
+    @classmethod
+    def discover(cls, responses, rows, page_url, date_parser):
+        """
+        Find the API response a rendered list was built from.
+
+        The response holding a list of records whose titles match most of
+        the extracted entries wins. Its link and date fields are the ones
+        that agree with every matched entry.
+
+        Args:
+            responses (list): (url, decoded JSON) of the XHR responses of the page
+            rows (list): Rows extracted from the rendered page
+            page_url (str): URL of the page
+            date_parser (DateParser): The site's date parser
+
+        Returns:
+            Endpoint: The mapping, None when no response matches the entries
+        """
+        entries = [row for row in rows if not row.get('error') and row.get('title')]
+        best = None
+        for url, data in responses:
+            for records_path, records in _record_lists(data):
+                records = [_fields(record) for record in records]
+                for title_path in {path for record in records for path, value in record.items()
+                                   if isinstance(value, str)}:
+                    pairs = []
+                    used = set()
+                    for row in entries:
+                        title = _normalize(row['title'])
+                        # Lists repeat titles, e.g. yearly notices, so every record pairs with one row, in order
+                        index = next((i for i, record in enumerate(records) if i not in used and
+                                      title_path in record and _title_matches(record[title_path], title)), None)
+                        if index is not None:
+                            used.add(index)
+                            pairs.append((row, records[index]))
+                    if best is None or len(pairs) > len(best[3]):
+                        best = (url, records_path, title_path, pairs)
+
+        if best is None or len(best[3]) < max(1, len(entries) // 2):
+            return None
+        url, records_path, title_path, pairs = best
+        link, link_template = cls._discover_link(pairs, page_url)
+        if not (link or link_template):
+            return None
+        return cls(url, records_path, title_path, link=link, link_template=link_template,
+                   date=cls._discover_date(pairs, date_parser))
+
+    @staticmethod
+    def _discover_link(pairs, page_url):
+        """Path of the link field, or else a template with the field the link is built from."""
+        links = [urljoin(page_url, row['href']) for row, _ in pairs]
+        fields = pairs[0][1]
+        for path in fields:
+            if all(path in record and urljoin(page_url, str(record[path])) == link
+                   for link, (_, record) in zip(links, pairs)):
+                return path, None
+        # Longest values first, so an article id wins over a small type code
+        for path in sorted(fields, key=lambda p: len(str(fields[p])), reverse=True):
+            value = str(fields[path])
+            if len(value) < 2 or value not in links[0]:
+                continue
+            template = links[0].replace(value, f"{{{path}}}")
+            if all(path in record and template.replace(f"{{{path}}}", str(record[path])) == link
+                   for link, (_, record) in zip(links, pairs)):
+                return None, template
+        return None, None
+
+    @staticmethod
+    def _discover_date(pairs, date_parser):
+        """Path of the field holding the same day as the entries' dates."""
+        dated = [(date_parser.parse(row['date']), record) for row, record in pairs if row.get('date')]
+        dated = [(date, record) for date, record in dated if date is not None]
+        if not dated:
+            return None
+        for path in dated[0][1]:
+            if all(path in record and _same_day(date, record[path], date_parser) for date, record in dated):
+                return path
+        return None
+
+
+def _same_day(date, value, date_parser):
+    if isinstance(value, bool):
+        return False
+    try:
+        parsed = date_parser.parse(date_text(value, date_parser.timezone))
+    except Exception:
+        return False
+    return parsed is not None and parsed.date() == date.date()
@@ -0,0 +1,146 @@
+import re
+from functools import lru_cache
+import lxml.html
+from lxml.cssselect import CSSSelector
+
+DESCRIPTION_SELECTOR = 'head > meta[name="description"], head > meta[name*="description"], head > meta[name*="Description"], head > meta[property="og:description"]'
+
+# Runs inside the page and returns everything the feed needs in one round trip.
+# Entries mirror what ElementHandle.get_attribute / inner_text would return, a
+# row that cannot be read carries an error message instead.
+EXTRACT_SCRIPT = """
+({descriptionSelector, container, link, title, date, next}) => {
+    const required = (ele, selector) => {
+        const found = ele.querySelector(selector);
+        if (!found) {
+            throw new Error(`No element found matching selector: ${selector}`);
+        }
+        return found;
+    };
+    const description = document.querySelector(descriptionSelector);
+    const entries = Array.from(document.querySelectorAll(container), (ele) => {
+        try {
+            return {
+                href: required(ele, link).getAttribute("href"),
+                title: required(ele, title).innerText.trim(),
+                date: required(ele, date).innerText.trim(),
+            };
+        } catch (e) {
+            return {error: String(e && e.message || e)};
+        }
+    });
+    const content = {
+        title: document.title,
+        description: description ? description.getAttribute("content") : null,
+        entries: entries,
+    };
+    if (next) {
+        const found = document.querySelector(next);
+        content.next = found ? found.getAttribute("href") : null;
+    }
+    return content;
+}
+"""
+
+
+def script_args(selector, next_page=None):
+    """Arguments passed to EXTRACT_SCRIPT for the given Selector and next page selector."""
+    return {
+        'descriptionSelector': DESCRIPTION_SELECTOR,
+        'container': selector.container,
+        'link': selector.link,
+        'title': selector.title,
+        'date': selector.date,
+        'next': next_page,
+    }
+
+
+_ascii_whitespace = re.compile(r'[ \t\n\r\f]+')
+
+
+@lru_cache(maxsize=None)
+def _compile(selector):
+    return CSSSelector(selector)
+
+
+def _text(ele):
+    # Close to innerText.trim(): whitespace runs collapse to one space
+    return _ascii_whitespace.sub(' ', ele.text_content()).strip()
+
+
+def _required(ele, selector):
+    found = _compile(selector)(ele)
+    if not found:
+        raise Exception(f"No element found matching selector: {selector}")
+    return found[0]
+
+
+def extract_static(body, selector, encoding=None, next_page=None):
+    """
+    Extract the same content as EXTRACT_SCRIPT from server-rendered HTML.
+
+    Args:
+        body (bytes): Raw HTML of the page
+        selector (Selector): CSS selectors of the site
+        encoding (str): Charset from the HTTP headers, detected from the page when None
+        next_page (str): CSS selector of the link to the next page, if the list is paginated
+
+    Returns:
+        dict: Page title, description and the raw entry rows, plus the next
+            page's href when `next_page` is given
+    """
+    parser = lxml.html.HTMLParser(encoding=encoding)
+    doc = lxml.html.document_fromstring(body, parser=parser)
+
+    title = doc.find('.//title')
+    description = _compile(DESCRIPTION_SELECTOR)(doc)
+
+    entries = []
+    for ele in _compile(selector.container)(doc):
+        try:
+            entries.append({
+                'href': _required(ele, selector.link).get('href'),
+                'title': _text(_required(ele, selector.title)),
+                'date': _text(_required(ele, selector.date)),
+            })
+        except Exception as e:
+            entries.append({'error': str(e)})
+
+    content = {
+        # document.title strips and collapses ASCII whitespace only
+        'title': _ascii_whitespace.sub(' ', title.text_content()).strip(' \t\n\r\f') if title is not None else '',
+        'description': description[0].get('content') if description else None,
+        'entries': entries,
+    }
+    if next_page:
+        found = _compile(next_page)(doc)
+        content['next'] = found[0].get('href') if found else None
+    return content
+
+
+def extract_article(body, selector, url, encoding=None):
+    """
+    Extract the body of an article page as HTML for content:encoded.
+
+    Scripts and styles are dropped and links and images made absolute, so the
+    HTML can be shown outside the site.
+
+    Args:
+        body (bytes): Raw HTML of the article page
+        selector (str): CSS selector of the element holding the article text
+        url (str): URL of the article, relative links are resolved against it
+        encoding (str): Charset from the HTTP headers, detected from the page when None
+
+    Returns:
+        str: HTML of the first matching element, None when nothing matches
+    """
+    parser = lxml.html.HTMLParser(encoding=encoding)
+    doc = lxml.html.document_fromstring(body, parser=parser)
+    found = _compile(selector)(doc)
+    if not found:
+        return None
+    article = found[0]
+    for ele in article.xpath('.//script | .//style | .//noscript'):
+        ele.drop_tree()
+    article.make_links_absolute(url, resolve_base_href=False)
+    return lxml.html.tostring(article, encoding='unicode').strip()
@@ -0,0 +1,229 @@
+import json
+import re
+
+# Characters XML 1.0 does not allow, dropped instead of failing the whole feed
+_invalid_xml = re.compile('[^\t\n\r\u0020-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+
+def escape(text):
+    """Escape text content the way lxml serializes it."""
+    text = _invalid_xml.sub('', text)
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\r', '&#13;')
+
+
+_days = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_months = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def escape_attr(text):
+    return escape(text).replace('"', '&quot;')
+
+
+def format_rfc822(date):
+    """RFC 822 date independent of the locale, e.g. Wed, 23 Apr 2025 00:00:00 +0800."""
+    offset = date.utcoffset()
+    if offset is None:
+        zone = '-0000'
+    else:
+        minutes = int(offset.total_seconds()) // 60
+        sign = '-' if minutes < 0 else '+'
+        zone = f"{sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}"
+    return (f"{_days[date.weekday()]}, {date.day:02d} {_months[date.month - 1]} {date.year:04d} "
+            f"{date.hour:02d}:{date.minute:02d}:{date.second:02d} {zone}")
+
+
+class Channel:
+    def __init__(self, title, link, description, language='zh-CN', last_build=None):
+        """
+        Feed-level metadata.
+
+        Args:
+            title (str): The title of the feed
+            link (str): The URL of the website
+            description (str): A description of the feed
+            language (str): Language code of the feed
+            last_build (datetime): Time the items last changed
+        """
+        self.title = title
+        self.link = link
+        self.description = description
+        self.language = language
+        self.last_build = last_build
+
+
+def write_feeds(channel, entries, writers):
+    """
+    Write several feeds of the same entries in a single pass over them.
+
+    Args:
+        channel (Channel): Feed-level metadata
+        entries: Iterable of (date, title, link) or (date, title, link, content)
+            tuples, in feed order
+        writers (list): FeedWriter instances, one per output
+    """
+    for writer in writers:
+        writer.write_header(channel)
+    for entry in entries:
+        for writer in writers:
+            writer.write_item(*entry)
+    for writer in writers:
+        writer.write_footer()
+
+
+class FeedWriter:
+    def __init__(self, out):
+        """
+        Stream a feed document to a text file.
+
+        Args:
+            out: Text file opened with encoding='utf-8' and newline='\\n'
+        """
+        self.out = out
+        self.channel = None
+
+    def write(self, channel, entries):
+        """
+        Write a complete feed.
+
+        Args:
+            channel (Channel): Feed-level metadata
+            entries: Iterable of (date, title, link) or (date, title, link, content)
+                tuples, in feed order
+        """
+        write_feeds(channel, entries, [self])
+
+    def write_header(self, channel):
+        raise NotImplementedError
+
+    def write_item(self, date, title, link, content=None):
+        """
+        Args:
+            date (datetime): Publication date, None when unknown
+            title (str): Title of the entry
+            link (str): URL of the entry
+            content (str): HTML of the article body, None when not fetched
+        """
+        raise NotImplementedError
+
+    def write_footer(self):
+        raise NotImplementedError
+
+
+class RSSWriter(FeedWriter):
+    """RSS 2.0, laid out like feedgen's pretty output."""
+
+    def write_header(self, channel):
+        write = self.out.write
+        write("<?xml version='1.0' encoding='UTF-8'?>\n"
+              '<rss xmlns:atom="http://www.w3.org/2005/Atom" '
+              'xmlns:content="http://purl.org/rss/1.0/modules/content/" version="2.0">\n'
+              '  <channel>\n')
+        write(f'    <title>{escape(channel.title)}</title>\n')
+        write(f'    <link>{escape(channel.link)}</link>\n')
+        write(f'    <description>{escape(channel.description)}</description>\n')
+        write('    <docs>http://www.rssboard.org/rss-specification</docs>\n'
+              '    <generator>python-feedgen</generator>\n')
+        if channel.language:
+            write(f'    <language>{escape(channel.language)}</language>\n')
+        if channel.last_build:
+            write(f'    <lastBuildDate>{format_rfc822(channel.last_build)}</lastBuildDate>\n')
+
+    def write_item(self, date, title, link, content=None):
+        title = escape(title)
+        link = escape(link)
+        item = (
+            '    <item>\n'
+            f'      <title>{title}</title>\n'
+            f'      <link>{link}</link>\n'
+            f'      <description>{title}</description>\n'
+        )
+        if content:
+            item += f'      <content:encoded>{escape(content)}</content:encoded>\n'
+        item += f'      <guid isPermaLink="false">{link}</guid>\n'
+        if date:
+            item += f'      <pubDate>{format_rfc822(date)}</pubDate>\n'
+        self.out.write(item + '    </item>\n')
+
+    def write_footer(self):
+        self.out.write('  </channel>\n</rss>\n')
+
+
+class AtomWriter(FeedWriter):
+    """Atom 1.0 (RFC 4287)."""
+
+    def write_header(self, channel):
+        self.channel = channel
+        write = self.out.write
+        write("<?xml version='1.0' encoding='UTF-8'?>\n")
+        if channel.language:
+            write(f'<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="{escape_attr(channel.language)}">\n')
+        else:
+            write('<feed xmlns="http://www.w3.org/2005/Atom">\n')
+        write(f'  <id>{escape(channel.link)}</id>\n')
+        write(f'  <title>{escape(channel.title)}</title>\n')
+        # RFC 4287 requires an author on the feed or on every entry
+        write(f'  <author><name>{escape(channel.title)}</name></author>\n')
+        if channel.last_build:
+            write(f'  <updated>{channel.last_build.isoformat()}</updated>\n')
+        write(f'  <link href="{escape_attr(channel.link)}"/>\n')
+        write(f'  <subtitle>{escape(channel.description)}</subtitle>\n')
+
+    def write_item(self, date, title, link, content=None):
+        title = escape(title)
+        # Atom requires updated on every entry
+        updated = date or self.channel.last_build
+        item = (
+            '  <entry>\n'
+            f'    <id>{escape(link)}</id>\n'
+            f'    <title>{title}</title>\n'
+        )
+        if updated:
+            item += f'    <updated>{updated.isoformat()}</updated>\n'
+        if date:
+            item += f'    <published>{date.isoformat()}</published>\n'
+        item += (
+            f'    <link href="{escape_attr(link)}"/>\n'
+            f'    <summary>{title}</summary>\n'
+        )
+        if content:
+            item += f'    <content type="html">{escape(content)}</content>\n'
+        self.out.write(item + '  </entry>\n')
+
+    def write_footer(self):
+        self.out.write('</feed>\n')
+
+
+class JSONFeedWriter(FeedWriter):
+    """JSON Feed 1.1."""
+
+    def write_header(self, channel):
+        header = {
+            'version': 'https://jsonfeed.org/version/1.1',
+            'title': channel.title,
+            'home_page_url': channel.link,
+            'description': channel.description,
+        }
+        if channel.language:
+            header['language'] = channel.language
+        # Leave the object open so items can be streamed into it
+        self.out.write(json.dumps(header, ensure_ascii=False, indent=2)[:-2] + ',\n  "items": [')
+        self.separator = '\n'
+
+    def write_item(self, date, title, link, content=None):
+        item = {'id': link, 'url': link, 'title': title, 'content_text': title}
+        if content:
+            item['content_html'] = content
+        if date:
+            item['date_published'] = date.isoformat()
+        self.out.write(self.separator + '    ' + json.dumps(item, ensure_ascii=False))
+        self.separator = ',\n'
+
+    def write_footer(self):
+        self.out.write('\n  ]\n}\n')
+
+
+FORMATS = {
+    'rss': RSSWriter,
+    'atom': AtomWriter,
+    'json': JSONFeedWriter,
+}
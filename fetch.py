@@ -0,0 +1,74 @@
+import urllib.request
+from urllib.error import HTTPError
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+class HTTPStatusError(Exception):
+    def __init__(self, url, status, reason=None):
+        """
+        A page answered with an error status.
+
+        Args:
+            url (str): The URL of the page
+            status (int): HTTP status code
+            reason (str): HTTP reason phrase
+        """
+        super().__init__(f"HTTP {status}: {reason}" if reason else f"HTTP {status}")
+        self.url = url
+        self.status = status
+
+    @property
+    def retryable(self):
+        """Client errors are final, except timeouts and rate limiting."""
+        return self.status >= 500 or self.status in (408, 429)
+
+
+class Response:
+    def __init__(self, url, status, headers, body):
+        """
+        A plain HTTP response.
+
+        Args:
+            url (str): Final URL after redirects
+            status (int): HTTP status code
+            headers: Response headers (case-insensitive mapping)
+            body (bytes): Raw response body
+        """
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    @property
+    def charset(self):
+        return self.headers.get_content_charset() if self.headers else None
+
+
+def fetch(url, headers=None, timeout=30):
+    """
+    GET a URL without a browser. Blocking, run it in a thread from async code.
+
+    Args:
+        url (str): The URL to fetch
+        headers (dict): Extra request headers
+        timeout (int): Timeout in seconds
+
+    Returns:
+        Response: The response, also for HTTP error statuses
+    """
+    request = urllib.request.Request(url, headers={
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'zh-CN,zh;q=0.9',
+        **(headers or {}),
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as r:
+            return Response(r.geturl(), r.status, r.headers, r.read())
+    except HTTPError as e:
+        return Response(url, e.code, e.headers, e.read())
@@ -1,16 +1,44 @@
+import argparse
+import asyncio
+import atexit
+import json
+import multiprocessing
+import shutil
+import tempfile
+import os
 import yaml
-from playwright.sync_api import sync_playwright
-from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import pytz
-from feedgen.feed import FeedGenerator
-from dateutil.parser import parse
 from urllib.parse import urljoin
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from datetime import datetime
+from browser import BrowserSession, ResourcePolicy
+from cache import SiteCache
+from store import EntryStore, normalize_link
+from dateparse import DateParser
+from feedwriter import FORMATS, Channel, write_feeds
+from crawler import Crawler, CircuitBreaker
+from readiness import Readiness
+from extract import EXTRACT_SCRIPT, script_args, extract_static, extract_article
+from fetch import fetch, HTTPStatusError
+from endpoint import Endpoint
+from metrics import SiteMetrics, MetricsExporter
+from snapshot import Snapshots
+from storage import StorageStates
+from assets import AssetCache
+from server import FeedServer
+from polling import PollPolicy
+from shard import parse_shard, select
+from locks import file_lock
 
 import logging
+LOG_FORMAT = '[ %(asctime)s ] [ %(levelname)s ] %(message)s'
+LOG_DATEFMT = '%Y-%m-%d %H:%M:%S'
 logging.basicConfig(
     level=logging.INFO,
-    format='[ %(asctime)s ] [ %(levelname)s ] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
+    format=LOG_FORMAT,
+    datefmt=LOG_DATEFMT,
     handlers=[
         logging.FileHandler("rssfeedgen.log", encoding='utf-8'),
         logging.StreamHandler()
@@ -39,8 +67,23 @@ class Selector:
 class RSS:
     connect_max_retries = 3
     timezone = pytz.timezone('Asia/Shanghai')
+    settings = {}
+    # Shard crawled by this process in a sharded run, e.g. 2/4
+    shard = None
+    _site_cache = None
+    _entry_store = None
+    _metrics_exporter = None
+    _snapshots = None
+    _storage_states = None
+    _asset_cache = None
+    _replay_state_dir = None
+    _feed_server = None
+    _poll_policy = None
+    _circuit_breaker = None
 
-    def __init__(self, url, output_file, title=None, description=None):
+    def __init__(self, url, output_file, title=None, description=None, render=False, resources=None,
+                 readiness=None, max_items=None, timezone=None, date_formats=None,
+                 formats=None, pagination=None, articles=None, sla_minutes=None, api=None):
         """
         Initialize an RSS feed object.
 
@@ -49,141 +92,657 @@ class RSS:
             title (str): The title of the RSS feed
             description (str): A description of the RSS feed
             output_file (str): The file path where the RSS feed will be saved
+            render (bool): Always render the page in Chromium instead of
+                trying a plain HTTP GET first
+            resources (dict): ResourcePolicy options overriding the global
+                resources section when the page is rendered
+            readiness (dict): Readiness options overriding the global
+                readiness section
+            max_items (int): Number of stored entries in the feed, overriding
+                the global feed section
+            timezone (str): Timezone of the dates on the site, RSS.timezone by default
+            date_formats (list): strptime formats tried first when parsing dates
+            formats (list): Feed formats to write (rss, atom, json), overriding
+                the global feed section
+            pagination (dict): How to reach the next pages of the list, a CSS
+                selector of the next link (next) or a URL template such as
+                index_{n}.html (template), and max_pages
+            articles (dict): Fetch the article of every entry for content:encoded,
+                with the CSS selector of the article body (content), overriding
+                the global articles section
+            sla_minutes (float): Freshness target of the feed, overriding the
+                global polling section
+            api (dict): The JSON endpoint the list is filled from (url,
+                records, title, link or link_template, date), or discover
+                to find it while rendering, overriding the global api section
         """
         self.url = url
         self.title = title
         self.description = description
         self.entries = []
         self.output_file = output_file
+        self.render = render
+        self.resources = resources
+        self.readiness = readiness
+        self.max_items = max_items
+        self.date_parser = DateParser(timezone or RSS.timezone, date_formats)
+        self.formats = formats
+        self.pagination = pagination
+        self.sla_minutes = sla_minutes
+        # Unix time the feed becomes staler than its SLA, set for each cycle
+        self.sla_deadline = None
+        self.articles = articles
+        self.api = api
+        self.next_page = None
+        self.cache_update = {}
+        self.metrics = SiteMetrics(url)
     
     @classmethod
     def load_sites_from_yaml(cls, config_path="config.yaml"):
         with open(config_path, 'r', encoding='utf-8') as f:
             config = yaml.safe_load(f)
-        
+
+        cls.settings = {k: v for k, v in config.items() if k != 'sites'}
         sites = []
         for site in config.get('sites', []):
-            rss = RSS(url=site['url'], output_file=site['output_file'])
+            rss = RSS(**{k: v for k, v in site.items() if k != 'selector'})
             selector = Selector(**site['selector'])
             sites.append((rss, selector))
         return sites
 
-    def get_response(self):
-        browser = None
+    @classmethod
+    def reset(cls, settings=None):
+        """
+        Close the shared state and drop it, so the next use builds it again
+        from `settings`.
+
+        Args:
+            settings (dict): New global settings, the current ones by default
+        """
+        if cls._entry_store is not None:
+            cls._entry_store.close()
+        if cls._site_cache is not None:
+            cls._site_cache.close()
+        if cls._circuit_breaker is not None:
+            cls._circuit_breaker.cache.close()
+        if settings is not None:
+            cls.settings = settings
+        cls._site_cache = cls._entry_store = cls._metrics_exporter = None
+        cls._snapshots = cls._storage_states = cls._asset_cache = None
+        cls._poll_policy = cls._circuit_breaker = None
+        cls._replay_state_dir = None
+
+    @classmethod
+    def state_dir(cls):
+        """
+        The configured state directory, or a fresh temporary one while
+        replaying snapshots, so a replay neither sees nor changes live state.
+        """
+        if not cls.snapshots().replaying:
+            return cls.settings.get('state_dir', '.cache')
+        if cls._replay_state_dir is None:
+            cls._replay_state_dir = tempfile.mkdtemp(prefix='rssfeedgen-replay-')
+            atexit.register(shutil.rmtree, cls._replay_state_dir, ignore_errors=True)
+        return cls._replay_state_dir
+
+    @classmethod
+    def site_cache(cls):
+        """The SiteCache kept in the configured state directory."""
+        if cls._site_cache is None:
+            state_dir = cls.state_dir()
+            cls._site_cache = SiteCache(os.path.join(state_dir, 'sites.db'))
+        return cls._site_cache
+
+    @classmethod
+    def entry_store(cls):
+        """The EntryStore kept in the configured state directory."""
+        if cls._entry_store is None:
+            state_dir = cls.state_dir()
+            cls._entry_store = EntryStore(os.path.join(state_dir, 'entries.db'))
+        return cls._entry_store
+
+    @classmethod
+    def metrics_exporter(cls):
+        """The MetricsExporter configured by the metrics section."""
+        if cls._metrics_exporter is None:
+            state_dir = cls.state_dir()
+            options = {
+                'jsonl': os.path.join(state_dir, 'metrics.jsonl'),
+                'prometheus': os.path.join(state_dir, 'rssfeedgen.prom'),
+                **cls.settings.get('metrics', {}),
+                'shard': cls.shard,
+            }
+            if cls.snapshots().replaying:
+                # Measured apart from the live runs, next to the replayed feeds
+                for key in ('jsonl', 'prometheus'):
+                    if options[key]:
+                        options[key] = os.path.join(cls.snapshots().output_dir, os.path.basename(options[key]))
+            cls._metrics_exporter = MetricsExporter(**options)
+        return cls._metrics_exporter
+
+    @classmethod
+    def snapshots(cls):
+        """The Snapshots configured by the snapshots section, off by default."""
+        if cls._snapshots is None:
+            cls._snapshots = Snapshots(**cls.settings.get('snapshots', {}))
+        return cls._snapshots
+
+    @classmethod
+    def storage_states(cls):
+        """The StorageStates configured by the storage section, kept in the state directory."""
+        if cls._storage_states is None:
+            state_dir = cls.state_dir()
+            options = {'dir': os.path.join(state_dir, 'storage'), **cls.settings.get('storage', {})}
+            cls._storage_states = StorageStates(**options)
+        return cls._storage_states
+
+    @classmethod
+    def asset_cache(cls):
+        """The AssetCache configured by the assets section, kept in the state directory."""
+        if cls._asset_cache is None:
+            state_dir = cls.state_dir()
+            options = {'dir': os.path.join(state_dir, 'assets'), **cls.settings.get('assets', {})}
+            cls._asset_cache = AssetCache(**options)
+        return cls._asset_cache
+
+    @classmethod
+    def poll_policy(cls):
+        """The PollPolicy configured by the polling section."""
+        if cls._poll_policy is None:
+            cls._poll_policy = PollPolicy(**cls.settings.get('polling', {}))
+        return cls._poll_policy
+
+    @classmethod
+    def circuit_breaker(cls):
+        """The CircuitBreaker configured by the breaker section, its state kept in the state directory."""
+        if cls._circuit_breaker is None:
+            state_dir = cls.state_dir()
+            cls._circuit_breaker = CircuitBreaker(
+                SiteCache(os.path.join(state_dir, 'hosts.db')), **cls.settings.get('breaker', {}))
+        return cls._circuit_breaker
+
+    def output_files(self):
+        """
+        Output path of every configured format. RSS is written to output_file,
+        the others next to it, e.g. gdstc.atom and gdstc.json for gdstc.xml.
+
+        Returns:
+            dict: Format name to file path
+        """
+        formats = self.formats or RSS.settings.get('feed', {}).get('formats', ['rss'])
+        output_file = self.output_file
+        if RSS.snapshots().replaying:
+            # The live feeds are left alone, replayed ones go next to the snapshots
+            output_file = os.path.join(RSS.snapshots().output_dir, os.path.basename(output_file))
+        base = os.path.splitext(output_file)[0]
+        outputs = {}
+        for fmt in formats:
+            if fmt not in FORMATS:
+                raise ValueError(f"Unknown feed format: {fmt}")
+            outputs[fmt] = output_file if fmt == 'rss' else f"{base}.{fmt}"
+        return outputs
+
+    def outputs_exist(self):
+        return all(os.path.exists(path) for path in self.output_files().values())
+
+    def feed_size(self):
+        """Number of entries in the feed, None for the whole history."""
+        if self.max_items is not None:
+            return self.max_items
+        return RSS.settings.get('feed', {}).get('max_items', 100)
+
+    async def get_response(self, session):
+        """
+        Load the page and extract its entries.
+
+        Returns:
+            bool: False when the page is unchanged since the last run
+        """
+        self.cache_update = {}
+        endpoint = self.endpoint()
+        if endpoint:
+            self.metrics.mode = 'api'
+            changed = await self._get_api_response(endpoint)
+            if changed is not None:
+                return changed
+            if 'url' not in self.api_options():
+                # Found by discovery, the page may have moved to another API
+                logging.info(f"Forgetting the JSON endpoint of {self.url}")
+                RSS.site_cache().update(self.url, endpoint=None)
+                endpoint = None
+
+        if not self.render:
+            self.metrics.mode = 'static'
+            changed = await self._get_static_response()
+            if changed is not None:
+                return changed
+            logging.info(f"Rendering {self.url} with Chromium")
+
+        # A single attempt, the Crawler requeues failed sites without holding a browser slot
+        self.metrics.mode = 'render'
+        readiness = Readiness(**self.readiness_options())
+        responses = [] if self.api_options().get('discover') and not endpoint else None
+        content = await self._render_page(session, self.url, readiness, responses)
+        # Validators of the static response do not describe rendered content
+        changed = self._load_if_changed(content, etag=None, last_modified=None)
+        if responses:
+            self._discover_endpoint(responses, content['entries'])
+        return changed
+
+    def api_options(self):
+        """API options of the site, merged over the global api section."""
+        return {**RSS.settings.get('api', {}), **(self.api or {})}
+
+    def endpoint(self):
+        """
+        The JSON endpoint to poll instead of the page, set in the site's api
+        section or found by discovery.
+
+        Returns:
+            Endpoint: The endpoint, None if the site has none
+        """
+        options = {k: v for k, v in self.api_options().items() if k != 'discover'}
+        if 'url' in options:
+            return Endpoint(**options)
+        discovered = RSS.site_cache().get(self.url).get('endpoint')
+        return Endpoint(**discovered) if discovered else None
+
+    def _discover_endpoint(self, responses, rows):
+        """Keep the endpoint the rendered entries came from, for the next runs."""
+        with self.metrics.phase('discover'):
+            endpoint = Endpoint.discover(responses, rows, self.url, self.date_parser)
+        if endpoint is None:
+            logging.info(f"No JSON endpoint matches the entries of {self.url} among {len(responses)} responses")
+            return
+        mapping = json.dumps(endpoint.to_dict(), ensure_ascii=False)
+        logging.info(f"Found the JSON endpoint of {self.url}, polling it from now on. "
+                     f"To keep it, set api: {mapping} for the site in config.yaml")
+        self.cache_update['endpoint'] = endpoint.to_dict()
+
+    async def _get_api_response(self, endpoint):
+        """
+        Fetch the site's JSON endpoint and map its records to entries.
+
+        Returns:
+            bool: Whether the content changed, None when the page has to be
+                loaded instead
+        """
         try:
-            with sync_playwright() as p:
-                browser = p.chromium.launch(
-                    headless=True,
-                    args=[
-                        "--disable-blink-features=AutomationControlled",
-                        "--disable-dev-shm-usage",
-                        "--no-sandbox",
-                        "--dns-prefetch-disable",
-                    ]
+            with self.metrics.phase('fetch'):
+                response = await self._fetch_page(
+                    endpoint.url, {'Accept': 'application/json, text/plain, */*', 'Referer': self.url})
+            if not response.ok:
+                raise HTTPStatusError(endpoint.url, response.status)
+            with self.metrics.phase('extract'):
+                data = json.loads(response.body.decode(response.charset or 'utf-8'))
+                rows = endpoint.rows(data, self.date_parser.timezone)
+        except Exception as e:
+            logging.warning(f"JSON endpoint failed for {self.url}: {str(e)}")
+            return None
+        if not rows:
+            logging.warning(f"JSON endpoint of {self.url} returned no records")
+            return None
+
+        # The API has no page title, keep the one of the last page load
+        cached = RSS.site_cache().get(self.url)
+        content = {'title': self.title or cached.get('title'), 'description': self.description, 'entries': rows}
+        changed = self._load_if_changed(content, etag=None, last_modified=None)
+        self._report_transfer(len(response.body))
+        return changed
+
+    def readiness_options(self):
+        """Readiness options of the site, merged over the global readiness section."""
+        return {**RSS.settings.get('readiness', {}), **(self.readiness or {})}
+
+    def resource_policy(self):
+        """ResourcePolicy options of the site, merged over the global resources section."""
+        return {**RSS.settings.get('resources', {}), **(self.resources or {})}
+
+    def pagination_options(self):
+        """Pagination options of the site, merged over the global pagination section."""
+        return {**RSS.settings.get('pagination', {}), **(self.pagination or {})}
+
+    def article_options(self):
+        """Article options of the site, merged over the global articles section."""
+        return {**RSS.settings.get('articles', {}), **(self.articles or {})}
+
+    async def fetch_articles(self):
+        """
+        Fetch the article bodies of the feed's entries that are not cached yet.
+
+        Articles are fetched concurrently, at most `concurrency` at a time,
+        and cached by link in the entry store, so each one is fetched once.
+        A failed article is tried again on the next update.
+        """
+        options = self.article_options()
+        if not options.get('content'):
+            return
+        links = [link for _, _, link in RSS.entry_store().latest(self.url, self.feed_size())]
+        cached = RSS.entry_store().articles(links)
+        missing = [link for link in links if normalize_link(link) not in cached]
+        if not missing:
+            return
+
+        semaphore = asyncio.Semaphore(options.get('concurrency', 4))
+        results = await asyncio.gather(
+            *(self._fetch_article(link, options['content'], semaphore) for link in missing))
+        contents = {link: content for link, content in zip(missing, results) if content}
+        RSS.entry_store().save_articles(contents)
+        self.metrics.articles = len(contents)
+        logging.info(f"{self.url}: fetched {len(contents)}/{len(missing)} articles")
+
+    async def _fetch_article(self, link, selector, semaphore):
+        async with semaphore:
+            try:
+                response = await self._fetch_page(link)
+                if not response.ok:
+                    raise Exception(f"HTTP {response.status}")
+                content = extract_article(response.body, selector, link, response.charset)
+                if content is None:
+                    raise Exception(f"No element found matching selector: {selector}")
+                return content
+            except Exception as e:
+                logging.warning(f"Failed to fetch article {link}: {str(e)}")
+                return None
+
+    async def get_more_pages(self, session):
+        """
+        Follow the pagination of a changed list until a page brings no new link.
+
+        The first page is already loaded. Further pages are loaded the same
+        way, statically or rendered, and their entries are added to the
+        first page's, up to max_pages pages in total. A page whose links are
+        all in the entry store ends the catch-up, so a list with nothing
+        older to recover costs no extra load.
+        """
+        options = self.pagination_options()
+        template = options.get('template')
+        next_selector = options.get('next')
+        if not (template or next_selector) or self.metrics.mode == 'api':
+            # Pages of the list are HTML, not pages of its API
+            return
+
+        readiness = Readiness(**self.readiness_options())
+        page_entries = self.entries
+        next_url = self.next_page
+        for number in range(2, options.get('max_pages', 5) + 1):
+            links = {normalize_link(link) for _, _, link in page_entries}
+            if not links or RSS.entry_store().known(self.url, links) == links:
+                logging.info(f"{self.url}: page {number - 1} has no new entries, stopping")
+                return
+            if template:
+                next_url = urljoin(self.url, template.format(n=number))
+            if not next_url:
+                return
+
+            try:
+                if self.metrics.mode == 'static':
+                    with self.metrics.phase('fetch'):
+                        response = await self._fetch_page(next_url)
+                    if response.status == 404:
+                        logging.info(f"{self.url}: no page {number}, the list ends on page {number - 1}")
+                        return
+                    if not response.ok:
+                        raise Exception(f"HTTP {response.status}")
+                    with self.metrics.phase('extract'):
+                        content = extract_static(response.body, self.selector, response.charset, next_selector)
+                    self._report_transfer(len(response.body))
+                else:
+                    content = await self._render_page(session, next_url, readiness)
+            except Exception as e:
+                logging.warning(f"Failed to load page {number} of {self.url}: {str(e)}")
+                return
+
+            page_url = next_url
+            next_url = urljoin(page_url, content['next']) if content.get('next') else None
+            before = len(self.entries)
+            self._load_rows(content['entries'], page_url)
+            page_entries = self.entries[before:]
+            self.metrics.pages = number
+            self.metrics.entries = len(self.entries)
+            logging.info(f"{self.url}: {len(page_entries)} entries on page {number}")
+
+    @staticmethod
+    async def _transferred(sizes):
+        """Total bytes of the finished requests whose sizes were collected."""
+        total = 0
+        for result in await asyncio.gather(*sizes, return_exceptions=True):
+            if isinstance(result, dict):
+                total += max(result['responseBodySize'], 0) + max(result['responseHeadersSize'], 0)
+        return total
+
+    def _report_transfer(self, transferred, blocked=0):
+        elapsed = self.metrics.elapsed()
+        self.metrics.bytes += transferred
+        self.metrics.blocked += blocked
+        logging.info(
+            f"{self.url}: {transferred / 1024:.1f}KB transferred, {blocked} requests blocked, extracted in {elapsed:.2f}s")
+
+    async def _fetch_page(self, url, headers=None):
+        """GET a page over plain HTTP, or from its snapshot when replaying."""
+        snapshots = RSS.snapshots()
+        if snapshots.replaying:
+            return snapshots.load_response(url)
+        # The cookies the site set while rendered, e.g. a passed WAF challenge
+        cookie = RSS.storage_states().cookie_header(self.url, url)
+        if cookie:
+            headers = {'Cookie': cookie, **(headers or {})}
+        response = await asyncio.to_thread(fetch, url, headers)
+        if snapshots.recording:
+            snapshots.save_response(url, response)
+        return response
+
+    async def _render_page(self, session, url, readiness, responses=None):
+        """
+        Load a page of the site in Chromium and extract it in a single round trip.
+
+        Args:
+            responses (list): Receives (url, decoded JSON) of every JSON
+                response to a GET XHR or fetch of the page, when given
+
+        Returns:
+            dict: Page title, description and the raw entry rows
+        """
+        snapshots = RSS.snapshots()
+        # Every page of the site starts from the cookies and localStorage of its last render
+        storage = RSS.storage_states() if not snapshots.replaying else None
+        # Includes launching or recycling Chromium when that is due
+        with self.metrics.phase('context'):
+            context = await session.new_context(
+                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                viewport={'width': 1920, 'height': 1080},
+                ignore_https_errors=True,
+                **snapshots.context_options(url),
+                **(storage.context_options(self.url) if storage else {})
+            )
+        page = None
+        sizes = []
+        xhr = []
+
+        def on_finished(request):
+            sizes.append(asyncio.ensure_future(request.sizes()))
+
+        def on_response(response):
+            xhr.append(asyncio.ensure_future(self._json_response(response)))
+
+        try:
+            await snapshots.attach(context, url)
+            if not (snapshots.recording or snapshots.replaying):
+                # A snapshot holds what the site served, not what the cache did
+                await RSS.asset_cache().attach(context, self.metrics)
+            # Registered last so it sees every request before the asset cache and HAR routes
+            policy = ResourcePolicy(self.url, **self.resource_policy())
+            await policy.attach(context)
+
+            page = await context.new_page()
+            page.set_default_timeout(60000)
+            page.on("requestfinished", on_finished)
+            if responses is not None:
+                page.on("response", on_response)
+
+            with self.metrics.phase('goto'):
+                response = await page.goto(
+                    url,
+                    wait_until=readiness.wait_until,
+                    timeout=60000
                 )
 
-                for attempt in range(RSS.connect_max_retries):
-                    context = page = None
-                    try:
-                        context = browser.new_context(
-                            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                            viewport={'width': 1920, 'height': 1080},
-                            ignore_https_errors=True
-                        )
-                        
-                        page = context.new_page()
-                        page.set_default_timeout(60000)  
-                        
-                        response = page.goto(
-                            self.url,
-                            wait_until="networkidle",
-                            timeout=60000
-                        )
-                        
-                        if not response.ok:
-                            raise Exception(f"HTTP {response.status}: {response.status_text}")
-                        
-                        # Wait for content with increased timeout
-                        page.wait_for_selector(
-                            f"{self.selector.container} >> nth=0",
-                            timeout=60000,
-                            state="visible"
-                        )
-                        page.wait_for_timeout(1000) 
-                        # logging.info(page.content())
-                        
-                        # Extract content
-                        self._extract_page_content(page)
-                        
-                        return  # Success - exit method
-                        
-                    except Exception as e:
-                        logging.warning(
-                            f"Attempt {attempt + 1}/{RSS.connect_max_retries} failed for {self.url}: {str(e)}")
-                        
-                        if attempt == RSS.connect_max_retries - 1:
-                            raise
-                        
-                        # Cleanup before retry
-                        if page:
-                            try:
-                                page.close()
-                            except:
-                                pass
-                        if context:
-                            try:
-                                context.close()
-                            except:
-                                pass
-                                
-                        # Wait with exponential backoff
-                        import time
-                        time.sleep(5 * (2 ** attempt))  # 5, 10, 20 seconds
-                        
-        except Exception as e:
-            logging.error(f"Failed to process {self.url}: {str(e)}")
-            raise
+            if not response.ok:
+                if storage and response.status in (401, 403):
+                    # A stale challenge cookie can be refused, the next render starts clean
+                    storage.forget(self.url)
+                raise HTTPStatusError(url, response.status, response.status_text)
+
+            with self.metrics.phase('ready'):
+                await readiness.wait(page, self.selector.container)
+            # logging.info(await page.content())
+
+            with self.metrics.phase('extract'):
+                content = await page.evaluate(
+                    EXTRACT_SCRIPT, script_args(self.selector, self.pagination_options().get('next')))
+
+            self._report_transfer(await self._transferred(sizes), policy.blocked)
+            if storage:
+                await storage.save(context, self.url)
+            if responses is not None:
+                responses.extend(r for r in await asyncio.gather(*xhr) if r is not None)
         finally:
-            if browser:
-                try:
-                    browser.close()
-                except:
-                    pass
-
-    def _extract_page_content(self, page):
-        """Extract content from loaded page"""
-        self.title = page.title() or self.url
-        description_element = page.query_selector('head > meta[name="description"], head > meta[name*="description"], head > meta[name*="Description"], head > meta[property="og:description"]')
-        self.description = description_element.get_attribute("content") if description_element else None
-
-        container = page.query_selector_all(self.selector.container)
-        if not container:
+            if page is not None:
+                page.remove_listener("requestfinished", on_finished)
+                if responses is not None:
+                    page.remove_listener("response", on_response)
+            # Requests still running when the list was extracted would fail once the context is closed
+            for task in sizes + xhr:
+                task.cancel()
+            await asyncio.gather(*sizes, *xhr, return_exceptions=True)
+            await session.release(context)
+        self.metrics.browser_memory_mb = session.memory_mb()
+        return content
+
+    @staticmethod
+    async def _json_response(response):
+        """(url, decoded JSON) of an XHR response, None for anything else."""
+        request = response.request
+        if request.resource_type not in ('xhr', 'fetch') or request.method != 'GET' or not response.ok:
+            return None
+        try:
+            return response.url, json.loads(await response.body())
+        except Exception:
+            return None
+
+    async def _get_static_response(self):
+        """
+        Fetch the page over plain HTTP and extract it without a browser.
+
+        Returns:
+            bool: Whether the content changed, None when the page has to be
+                rendered instead
+        """
+        snapshots = RSS.snapshots()
+        # A recorded or replayed page must be a full response, not a 304
+        revalidate = self.outputs_exist() and not (snapshots.recording or snapshots.replaying)
+        cached = RSS.site_cache().get(self.url) if revalidate else {}
+        headers = {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+        try:
+            with self.metrics.phase('fetch'):
+                response = await self._fetch_page(self.url, headers)
+            if response.status == 304:
+                logging.info(f"Not modified: {self.url}")
+                self._report_transfer(len(response.body))
+                self.title = self.title or cached.get('title')
+                return False
+            if not response.ok:
+                raise HTTPStatusError(self.url, response.status)
+            with self.metrics.phase('extract'):
+                content = extract_static(
+                    response.body, self.selector, response.charset, self.pagination_options().get('next'))
+        except HTTPStatusError as e:
+            if e.status in (404, 410):
+                # Gone for any client, rendering it would not help
+                raise
+            logging.warning(f"Static fetch failed for {self.url}: {str(e)}")
+            return None
+        except Exception as e:
+            logging.warning(f"Static fetch failed for {self.url}: {str(e)}")
+            return None
+
+        if not content['entries']:
+            logging.info(f"No static elements found matching selector: {self.selector.container}")
+            return None
+
+        changed = self._load_if_changed(
+            content,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'))
+        self._report_transfer(len(response.body))
+        return changed
+
+    def _load_if_changed(self, content, **validators):
+        """
+        Load extracted content unless its fingerprint matches the last run.
+
+        The new fingerprint and validators are only saved by rss_builder once
+        the feed has been written.
+
+        Returns:
+            bool: Whether the content changed
+        """
+        fingerprint = SiteCache.fingerprint(content)
+        cached = RSS.site_cache().get(self.url)
+        self.cache_update = dict(validators, fingerprint=fingerprint)
+        # A replay always extracts and writes the feed, that is what it is run for
+        if cached.get('fingerprint') == fingerprint and self.outputs_exist() and not RSS.snapshots().replaying:
+            logging.info(f"Content unchanged: {self.url}")
+            self.title = self.title or cached.get('title')
+            return False
+
+        self._load_content(content)
+        self.cache_update['title'] = self.title
+        return True
+
+    def _load_content(self, content):
+        """
+        Fill title, description and entries from extracted page content.
+
+        Args:
+            content (dict): Page title, description and the raw entry rows
+        """
+        self.title = content['title'] or self.url
+        self.description = content['description']
+        self.next_page = urljoin(self.url, content['next']) if content.get('next') else None
+
+        if not content['entries']:
             raise Exception(f"No elements found matching selector: {self.selector.container}")
 
         self.clear_entries()
+        self._load_rows(content['entries'], self.url)
+        self.metrics.entries = len(self.entries)
 
-        for ele in container:
-            try:
-                self._process_single_entry(ele)
-            except Exception as e:
-                logging.error(f"Failed to process entry: {str(e)}")
-                continue
+    def _load_rows(self, rows, page_url):
+        with self.metrics.phase('parse'):
+            for row in rows:
+                try:
+                    self._process_single_entry(row, page_url)
+                except Exception as e:
+                    logging.error(f"Failed to process entry: {str(e)}")
+                    continue
 
-    def _process_single_entry(self, ele):
+    def _process_single_entry(self, row, page_url=None):
         try:
-            link_element = ele.query_selector(self.selector.link)
-            title_element = ele.query_selector(self.selector.title)
-            date_element = ele.query_selector(self.selector.date)
+            if row.get('error'):
+                raise Exception(row['error'])
 
             link = title = published_date = date_with_tz = None
-            link = urljoin(self.url, link_element.get_attribute("href"))# Ensure the link is absolute
-            title = title_element.inner_text().strip()
-            published_date = date_element.inner_text().strip()
-            date_with_tz = None  # 解析失败则设为 None
-            try:
-                date_obj = parse(published_date, fuzzy=True)  # 自动解析多种格式
-                date_with_tz = RSS.timezone.localize(date_obj)
-            except ValueError:
+            link = urljoin(page_url or self.url, row['href'])# Ensure the link is absolute
+            title = row['title']
+            published_date = row['date']
+            date_with_tz = self.date_parser.parse(published_date)  # 解析失败则为 None
+            if date_with_tz is None:
                 logging.error(f"Date parsing error for entry: {published_date}")
 
             self.add_entry(date=date_with_tz, title=title, link=link)
@@ -192,34 +751,102 @@ class RSS:
             raise
 
     def gen_feed(self):
-        # Sort entries by date
-        self.entries.sort(key=lambda x: x[0])
-
-        fg = FeedGenerator()
-        fg.title(title=self.title)
-        fg.link(href=self.url)
-        fg.description(description=self.description)
-        fg.language('zh-CN')
-        fg.id(self.url)
-
-        # Add sorted entries to feed
-        for date, title, link in self.entries:
-            fe = fg.add_entry()
-            fe.title(title)
-            fe.link(href=link)
-            fe.guid(link)
-            fe.description(title)
-            fe.pubDate(date)
-
-        fg.rss_str(pretty=True)
-        fg.rss_file(self.output_file, pretty=True)
-
-    def rss_builder(self, selector):
+        """
+        Write the feed in every configured format unless its items and
+        channel metadata are unchanged.
+
+        Returns:
+            bool: Whether the output files were written
+        """
+        # The newest entries of the site's history, newest first
+        entries = RSS.entry_store().latest(self.url, self.feed_size())
+        if self.article_options().get('content'):
+            contents = RSS.entry_store().articles(link for _, _, link in entries)
+            entries = [(date, title, link, contents.get(normalize_link(link)))
+                       for date, title, link in entries]
+
+        # lastBuildDate is left out of the hashes and only advances with the items
+        cached = RSS.site_cache().get(self.url)
+        items_hash = SiteCache.fingerprint(
+            [(date.isoformat() if date else None, *item) for date, *item in entries])
+        outputs = self.output_files()
+        feed_hash = SiteCache.fingerprint([items_hash, self.title, self.url, self.description, outputs])
+        if cached.get('feed_hash') == feed_hash and self.outputs_exist() and not RSS.snapshots().replaying:
+            logging.info(f"Feed unchanged, keeping {', '.join(outputs.values())}")
+            return False
+        if cached.get('items_hash') == items_hash and cached.get('last_build'):
+            last_build = datetime.fromisoformat(cached['last_build'])
+        else:
+            last_build = datetime.now(pytz.utc).replace(microsecond=0)
+
+        channel = Channel(
+            title=self.title,
+            link=self.url,
+            # RSS requires a description, not every site has a meta description
+            description=self.description or self.title,
+            language='zh-CN',
+            last_build=last_build
+        )
+
+        # All formats are rendered in one pass over the entries, into temporary
+        # files first so readers never see a partial feed. The lock keeps two
+        # processes updating the same site, e.g. the daemon and a manual run,
+        # from writing the temporary files at the same time.
+        lock_path = os.path.join(RSS.state_dir(), 'locks',
+                                 f"{os.path.basename(self.output_file)}.lock")
+        with file_lock(lock_path):
+            for path in outputs.values():
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with ExitStack() as stack:
+                writers = [
+                    FORMATS[fmt](stack.enter_context(open(f"{path}.tmp", 'w', encoding='utf-8', newline='\n')))
+                    for fmt, path in outputs.items()
+                ]
+                write_feeds(channel, entries, writers)
+            for path in outputs.values():
+                os.replace(f"{path}.tmp", path)
+        if RSS._feed_server:
+            for path in outputs.values():
+                RSS._feed_server.publish_file(path)
+
+        RSS.site_cache().update(
+            self.url, feed_hash=feed_hash, items_hash=items_hash, last_build=last_build.isoformat())
+        return True
+
+    async def rss_builder(self, selector, session=None):
         if not isinstance(selector, Selector):
             raise TypeError("Expected Selector object")
         self.selector = selector
-        self.get_response()
-        self.gen_feed()
+        if session is None:
+            async with BrowserSession(**RSS.settings.get('browser', {})) as session:
+                return await self.rss_builder(selector, session)
+
+        self.metrics = SiteMetrics(self.url)
+        changed = False
+        try:
+            changed = await self.get_response(session)
+            if changed:
+                await self.get_more_pages(session)
+                with self.metrics.phase('store'):
+                    new_entries = RSS.entry_store().upsert(self.url, self.entries)
+                self.metrics.new_entries = len(new_entries)
+                logging.info(f"{len(new_entries)} new entries on {self.url}")
+                if self.article_options().get('content'):
+                    with self.metrics.phase('articles'):
+                        await self.fetch_articles()
+                with self.metrics.phase('feed'):
+                    self.gen_feed()
+            else:
+                logging.info(f"Skipping feed generation for {self.url}")
+            if self.cache_update:
+                RSS.site_cache().update(self.url, **self.cache_update)
+        except Exception:
+            self.metrics.finish('failed')
+            raise
+        finally:
+            if self.metrics.status is None:
+                self.metrics.finish('updated' if changed else 'unchanged')
+            logging.info(self.metrics.summary())
 
     def add_entry(self, date, title, link):
         """
@@ -239,12 +866,85 @@ class RSS:
     @classmethod
     def update_feeds(cls, sites):
         """Update all RSS feeds in the sites list"""
-        for rss, selector in sites:
-            try:
-                rss.rss_builder(selector)
-                logging.info(f"Successfully processed {rss.title} ({rss.url})")
-            except Exception as e:
-                logging.error(f"Failed to process {rss.title} ({rss.url}): {str(e)}")
+        asyncio.run(cls.crawl(sites))
+
+    @classmethod
+    def run_workers(cls, workers, shard=(1, 1)):
+        """
+        Update the feeds of a shard with a pool of worker processes.
+
+        The sites of the shard are split again by URL hash, one part per
+        worker. Each worker loads the configuration itself and crawls its part
+        with its own browser, the output and state directories are shared.
+
+        Args:
+            workers (int): Number of worker processes
+            shard (tuple): (index, count) of the shard of this node, all sites by default
+        """
+        # Spawned rather than forked, the same on every platform and safe with the browser's threads
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = {pool.submit(_run_worker, shard, (worker, workers)): worker
+                       for worker in range(1, workers + 1)}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Worker {futures[future]}/{workers} failed: {str(e)}")
+
+    @classmethod
+    async def crawl(cls, sites, session=None, budget=None):
+        """
+        Update all RSS feeds in the sites list concurrently, the sites
+        closest to missing their SLA first.
+
+        Args:
+            sites: List of (RSS, Selector) tuples to process
+            session (BrowserSession): Browser shared across cycles, a new one
+                is launched for this cycle when omitted
+            budget (float): Seconds after which no further site is started,
+                polling.budget_minutes by default
+        """
+        policy = cls.poll_policy()
+        # A replay runs every recorded site, the live poll schedule is not its concern
+        replaying = cls.snapshots().replaying
+        due = [(rss, selector) for rss, selector in sites
+               if replaying or policy.due(cls.site_cache().get(rss.url)) or not rss.outputs_exist()]
+        if len(due) < len(sites):
+            logging.info(f"{len(sites) - len(due)} of {len(sites)} sites are not due yet")
+        if not due:
+            return
+
+        for rss, _ in due:
+            rss.sla_deadline = policy.sla_deadline(cls.site_cache().get(rss.url), rss.sla_minutes)
+        # Earliest deadline first, sites never crawled successfully before all others
+        due.sort(key=lambda site: site[0].sla_deadline or 0)
+
+        owns_session = session is None
+        if owns_session:
+            session = BrowserSession(**cls.settings.get('browser', {}))
+        try:
+            crawler = Crawler(session, exporter=cls.metrics_exporter(), breaker=cls.circuit_breaker(),
+                              **{'retries': cls.connect_max_retries, **cls.settings.get('crawl', {})})
+            await crawler.run(due, budget=budget if budget is not None else policy.budget)
+        finally:
+            if owns_session:
+                await session.close()
+
+        cls.asset_cache().prune()
+        for rss, _ in due:
+            if rss.metrics.status in ('updated', 'unchanged'):
+                cls.site_cache().update(rss.url, last_success=rss.metrics.timestamp + rss.metrics.duration)
+
+        if policy.adaptive:
+            for rss, _ in due:
+                if rss.metrics.status == 'deferred':
+                    # Still due, it leads the next cycle
+                    continue
+                times = cls.entry_store().recent_times(rss.url, policy.history)
+                state = policy.next_state(cls.site_cache().get(rss.url), rss.metrics, times)
+                cls.site_cache().update(rss.url, **state)
+                logging.info(f"Next poll of {rss.url} in {state['poll_interval'] / 60:.0f} minutes")
 
     @classmethod
     def start_schedule(cls, sites, hours=1, minutes=0, seconds=0):
@@ -258,18 +958,79 @@ class RSS:
             seconds (int): Seconds between updates
         """
         logging.basicConfig()
-        scheduler = BlockingScheduler()
+        asyncio.run(cls._run_schedule(sites, hours, minutes, seconds))
+
+    @classmethod
+    def serve(cls, sites, hours=1, minutes=0, seconds=0):
+        """
+        Run as a daemon: update the feeds periodically, starting right away,
+        and serve them over HTTP from memory.
+
+        The feeds already on disk are served until their first update.
+
+        Args:
+            sites: List of (RSS, Selector) tuples to process
+            hours (int): Hours between updates
+            minutes (int): Minutes between updates
+            seconds (int): Seconds between updates
+        """
+        server = FeedServer(**cls.settings.get('server', {}))
+        for rss, _ in sites:
+            for path in rss.output_files().values():
+                server.publish_file(path)
+        server.start()
+        cls._feed_server = server
+        try:
+            asyncio.run(cls._run_schedule(sites, hours, minutes, seconds, immediately=True))
+        finally:
+            cls._feed_server = None
+            server.stop()
+
+    @classmethod
+    async def _run_schedule(cls, sites, hours, minutes, seconds, immediately=False):
+        policy = cls.poll_policy()
+        if policy.adaptive:
+            # Each site has its own interval, check for due sites as often as the shortest one
+            hours, minutes, seconds = 0, 0, int(policy.min_interval)
+        # Stop starting sites with a fifth of the interval left, so the sites
+        # still running are done by the next tick rather than make it skip
+        budget = policy.budget or (hours * 3600 + minutes * 60 + seconds) * 0.8
+        # One browser for the life of the process, recycled by the session itself
+        session = BrowserSession(**cls.settings.get('browser', {}))
+        scheduler = AsyncIOScheduler()
+        # APScheduler pauses a job whose next_run_time is None, so it is only passed when set
+        first_run = {'next_run_time': datetime.now(pytz.utc)} if immediately else {}
         scheduler.add_job(
-            cls.update_feeds,
+            cls.crawl,
             'interval',
             hours=hours,
             minutes=minutes,
             seconds=seconds,
-            args=[sites]
+            args=[sites, session, budget],
+            **first_run
         )
         logging.info(
             f"Starting scheduler - Updates every {hours}h {minutes}m {seconds}s")
         scheduler.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            scheduler.shutdown(wait=False)
+            await session.close()
+
+
+def _run_worker(shard, worker):
+    """Crawl the sites of one worker of RSS.run_workers, in its own process."""
+    sites = select(RSS.load_sites_from_yaml(), *shard)
+    sites = select(sites, *worker, salt='worker')
+    RSS.shard = f"{worker[0]}/{worker[1]}"
+    if shard[1] > 1:
+        RSS.shard = f"{shard[0]}/{shard[1]} {RSS.shard}"
+    formatter = logging.Formatter(LOG_FORMAT.replace('%(message)s', f"[ {RSS.shard} ] %(message)s"), LOG_DATEFMT)
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(formatter)
+    logging.info(f"Worker {RSS.shard} crawling {len(sites)} sites")
+    RSS.update_feeds(sites)
 
 
 if __name__ == "__main__":
@@ -293,9 +1054,31 @@ if __name__ == "__main__":
     #               title='td:nth-child(1) a',
     #               date='td:nth-child(2)'))
     # ]
-    sites = RSS.load_sites_from_yaml()
-    # Run once immediately
-    RSS.update_feeds(sites)
+    parser = argparse.ArgumentParser(description="Generate RSS feeds for the sites in config.yaml")
+    parser.add_argument('--daemon', action='store_true',
+                        help='keep running, update the feeds every hour and serve them over HTTP')
+    parser.add_argument('--shard', type=parse_shard, default=(1, 1), metavar='i/N',
+                        help='only crawl the i-th of N shards of the sites, e.g. one per machine')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='crawl with this many processes, each with its own browser')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.daemon and args.workers > 1:
+        parser.error('--daemon runs in a single process, use --shard to split the sites between daemons')
+
+    if args.workers > 1:
+        RSS.run_workers(args.workers, args.shard)
+    else:
+        sites = RSS.load_sites_from_yaml()
+        if args.shard[1] > 1:
+            sites = select(sites, *args.shard)
+            RSS.shard = f"{args.shard[0]}/{args.shard[1]}"
+        if args.daemon:
+            RSS.serve(sites)
+        else:
+            # Run once immediately
+            RSS.update_feeds(sites)
 
     # Then start the scheduler (updates every hour by default)
     # RSS.start_schedule(sites, hours=0, minutes=5, seconds=0)
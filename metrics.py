@@ -0,0 +1,220 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from locks import file_lock
+
+
+class SiteMetrics:
+    def __init__(self, url):
+        """
+        Timings and counters of one crawl of a site.
+
+        Args:
+            url (str): The URL of the site
+        """
+        self.url = url
+        self.timestamp = time.time()
+        self.start = time.monotonic()
+        self.duration = None
+        self.status = None
+        self.mode = None
+        self.phases = {}
+        self.pages = 1
+        self.entries = 0
+        self.new_entries = 0
+        self.articles = 0
+        self.retries = 0
+        self.bytes = 0
+        self.blocked = 0
+        self.browser_memory_mb = None
+        self.sla_missed = None
+        self.asset_hits = 0
+        self.asset_misses = 0
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as the given phase."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.monotonic() - start)
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def finish(self, status):
+        self.status = status
+        self.duration = self.elapsed()
+
+    def summary(self):
+        phases = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+        summary = (f"{self.url}: {self.status} in {self.duration:.2f}s ({self.mode or 'no fetch'}; {phases}), "
+                   f"{self.pages} pages, {self.entries} entries, {self.new_entries} new, {self.retries} retries, "
+                   f"{self.bytes / 1024:.1f}KB, {self.blocked} blocked")
+        if self.asset_hit_ratio is not None:
+            summary += f", {self.asset_hits}/{self.asset_hits + self.asset_misses} assets from cache"
+        return summary
+
+    def to_dict(self):
+        return {
+            'type': 'site',
+            'time': self.timestamp,
+            'url': self.url,
+            'status': self.status,
+            'mode': self.mode,
+            'duration': self.duration,
+            'phases': self.phases,
+            'pages': self.pages,
+            'entries': self.entries,
+            'new_entries': self.new_entries,
+            'articles': self.articles,
+            'retries': self.retries,
+            'bytes': self.bytes,
+            'blocked': self.blocked,
+            'browser_memory_mb': self.browser_memory_mb,
+            'sla_missed': self.sla_missed,
+            'asset_hits': self.asset_hits,
+            'asset_misses': self.asset_misses,
+        }
+
+    @property
+    def asset_hit_ratio(self):
+        """Share of the cacheable assets served from the asset cache, None without any."""
+        total = self.asset_hits + self.asset_misses
+        return self.asset_hits / total if total else None
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsExporter:
+    # name, help text and the SiteMetrics value of every per-site gauge
+    site_gauges = [
+        ('rssfeedgen_crawl_seconds', 'Duration of the last crawl of the site', lambda m: m.duration),
+        ('rssfeedgen_crawl_success', 'Whether the last crawl of the site succeeded', lambda m: int(m.status in ('updated', 'unchanged'))),
+        ('rssfeedgen_crawl_timestamp_seconds', 'Unix time of the last crawl of the site', lambda m: m.timestamp),
+        ('rssfeedgen_pages', 'List pages loaded in the last crawl', lambda m: m.pages),
+        ('rssfeedgen_entries', 'Entries extracted in the last crawl', lambda m: m.entries),
+        ('rssfeedgen_new_entries', 'Entries not seen before in the last crawl', lambda m: m.new_entries),
+        ('rssfeedgen_articles', 'Article bodies fetched in the last crawl', lambda m: m.articles),
+        ('rssfeedgen_retries', 'Retries needed in the last crawl', lambda m: m.retries),
+        ('rssfeedgen_transferred_bytes', 'Bytes transferred in the last crawl', lambda m: m.bytes),
+        ('rssfeedgen_blocked_requests', 'Requests blocked in the last crawl', lambda m: m.blocked),
+        ('rssfeedgen_asset_cache_hit_ratio', 'Share of the static assets served from the asset cache in the last crawl',
+         lambda m: m.asset_hit_ratio),
+        ('rssfeedgen_sla_missed', 'Whether the feed of the site was staler than its SLA in the last cycle',
+         lambda m: None if m.sla_missed is None else int(m.sla_missed)),
+    ]
+    # name, help text and the value of every gauge of the last cycle
+    cycle_gauges = [
+        ('rssfeedgen_cycle_seconds', 'Duration of the last crawl cycle', lambda c: c['duration']),
+        ('rssfeedgen_cycle_sites', 'Sites crawled in the last cycle', lambda c: c['sites']),
+        ('rssfeedgen_cycle_failed_sites', 'Sites that failed in the last cycle', lambda c: c['failed']),
+        ('rssfeedgen_cycle_deferred_sites', 'Sites carried over to the next cycle', lambda c: c['deferred']),
+        ('rssfeedgen_cycle_sla_missed_sites', 'Sites staler than their SLA in the last cycle', lambda c: c['sla_missed']),
+        ('rssfeedgen_cycle_asset_cache_hits', 'Static assets served from the asset cache in the last cycle',
+         lambda c: c['asset_hits']),
+        ('rssfeedgen_cycle_asset_cache_misses', 'Static assets downloaded in the last cycle', lambda c: c['asset_misses']),
+        ('rssfeedgen_browser_launches', 'Chromium launches in the last cycle', lambda c: c['browser_launches']),
+        ('rssfeedgen_browser_launch_seconds', 'Time spent launching Chromium in the last cycle',
+         lambda c: c['browser_launch_seconds']),
+        ('rssfeedgen_browser_memory_bytes', 'Resident memory of the browser processes after the last cycle',
+         lambda c: None if c['browser_memory_mb'] is None else int(c['browser_memory_mb'] * 1024 * 1024)),
+    ]
+
+    def __init__(self, jsonl=None, prometheus=None, shard=None, jsonl_max_mb=10):
+        """
+        Export crawl metrics as JSON lines and as a Prometheus textfile.
+
+        Every crawl appends one JSON object per site and one for the whole
+        cycle to `jsonl`. Once it reaches `jsonl_max_mb` it is moved to
+        `jsonl`.1, replacing the previous one, so at most twice that much
+        history is kept. `prometheus` is rewritten with the latest values of
+        every site, for node_exporter's textfile collector.
+
+        The worker processes of a sharded run append to the same JSON lines
+        file and each write their own textfile, e.g. rssfeedgen-2of4.prom,
+        with their cycle gauges labelled by shard.
+
+        Args:
+            jsonl (str): JSON lines file, disabled when empty
+            prometheus (str): Prometheus textfile (*.prom), disabled when empty
+            shard (str): Shard crawled by this process, e.g. 2/4
+            jsonl_max_mb (float): Size at which the JSON lines file is rotated, 0 to never rotate
+        """
+        self.jsonl = jsonl
+        self.jsonl_max_bytes = jsonl_max_mb * 1024 * 1024
+        self.prometheus = prometheus
+        self.shard = shard
+        if prometheus and shard:
+            root, ext = os.path.splitext(prometheus)
+            self.prometheus = f"{root}-{shard.replace('/', 'of').replace(' ', '-')}{ext}"
+        self.latest = {}
+        self.cycle = None
+
+    def export(self, site_metrics, cycle):
+        """
+        Args:
+            site_metrics (list): SiteMetrics of the sites crawled in the cycle
+            cycle (dict): Cycle-level values, e.g. duration and browser launches
+        """
+        site_metrics = [m for m in site_metrics if m.status is not None]
+        self.cycle = dict(cycle, type='cycle', time=time.time(), shard=self.shard)
+        for m in site_metrics:
+            self.latest[m.url] = m
+
+        if self.jsonl:
+            os.makedirs(os.path.dirname(self.jsonl) or '.', exist_ok=True)
+            lines = [json.dumps(m.to_dict(), ensure_ascii=False) for m in site_metrics]
+            lines.append(json.dumps(self.cycle, ensure_ascii=False))
+            # Other shards append to the same file, their lines must not interleave
+            with file_lock(f"{self.jsonl}.lock"):
+                self._rotate()
+                with open(self.jsonl, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+
+        if self.prometheus:
+            self.write_prometheus()
+
+    def _rotate(self):
+        try:
+            if self.jsonl_max_bytes and os.path.getsize(self.jsonl) >= self.jsonl_max_bytes:
+                os.replace(self.jsonl, f"{self.jsonl}.1")
+        except OSError:
+            pass
+
+    def write_prometheus(self):
+        lines = []
+        for name, help_text, value in MetricsExporter.site_gauges:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for url, m in self.latest.items():
+                if value(m) is not None:
+                    lines.append(f'{name}{{site="{_label(url)}"}} {value(m)}')
+
+        lines += ["# HELP rssfeedgen_phase_seconds Time spent in each phase of the last crawl of the site",
+                  "# TYPE rssfeedgen_phase_seconds gauge"]
+        for url, m in self.latest.items():
+            for phase, seconds in m.phases.items():
+                lines.append(f'rssfeedgen_phase_seconds{{site="{_label(url)}",phase="{_label(phase)}"}} {seconds}')
+
+        if self.cycle:
+            # Sites are told apart by their URL, the cycles of the shards by their shard
+            labels = f'{{shard="{_label(self.shard)}"}}' if self.shard else ''
+            for name, help_text, value in MetricsExporter.cycle_gauges:
+                if value(self.cycle) is not None:
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge",
+                              f"{name}{labels} {value(self.cycle)}"]
+
+        os.makedirs(os.path.dirname(self.prometheus) or '.', exist_ok=True)
+        # The collector may read at any time, so the file is replaced atomically
+        tmp = f"{self.prometheus}.tmp"
+        with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, self.prometheus)
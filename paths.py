@@ -0,0 +1,23 @@
+import hashlib
+import re
+from urllib.parse import urlparse
+
+
+def site_filename(url, ext):
+    """
+    File name for the state of a site, readable and unique per URL.
+
+    The host and path of the URL, shortened to 80 characters, followed by
+    a hash of the whole URL, e.g. www.hp.gov.cn_gzhpkj_gkmlpt_index-1a2b3c4d.json.
+
+    Args:
+        url (str): The site URL
+        ext (str): File extension without the dot, e.g. har
+
+    Returns:
+        str: The file name, without a directory
+    """
+    parsed = urlparse(url)
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', f"{parsed.hostname}{parsed.path}").strip('_')[:80]
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]
+    return f"{name}-{digest}.{ext}"
@@ -0,0 +1,118 @@
+import time
+
+
+class PollPolicy:
+    def __init__(self, adaptive=True, min_minutes=15, max_minutes=720, backoff=1.5, history=20,
+                 sla_minutes=60, budget_minutes=None):
+        """
+        Decide when each site is polled next from how often it changes.
+
+        A site is polled again after `min_minutes` once it changed. While
+        nothing changes the interval grows by `backoff` per poll, up to half
+        the typical gap between the site's recent entries, and never beyond
+        `max_minutes`. A busy site thus stays close to the minimum while a
+        site that posts weekly settles at the maximum.
+
+        Every site also has a freshness target, its SLA: its feed should be
+        refreshed at most `sla_minutes` after the last successful crawl, or
+        after its polling interval if that is longer. Due sites are crawled
+        earliest SLA deadline first, and a cycle stops starting sites after
+        `budget_minutes`; the rest stay due and lead the next cycle.
+
+        Args:
+            adaptive (bool): Poll every site on every run when False
+            min_minutes (float): Shortest interval between two polls of a site
+            max_minutes (float): Longest interval between two polls of a site
+            backoff (float): Factor the interval grows by after a poll without change
+            history (int): Recent entries the typical gap is estimated from
+            sla_minutes (float): Default freshness target of a site
+            budget_minutes (float): Time after which a cycle starts no more sites,
+                unlimited for single runs and most of the interval for scheduled ones
+        """
+        self.adaptive = adaptive
+        self.min_interval = min_minutes * 60
+        self.max_interval = max_minutes * 60
+        self.backoff = backoff
+        self.history = history
+        self.sla = sla_minutes * 60
+        self.budget = budget_minutes * 60 if budget_minutes else None
+
+    def due(self, state, now=None):
+        """
+        Args:
+            state (dict): The site's SiteCache entry
+            now (float): Unix time, time.time() by default
+
+        Returns:
+            bool: Whether the site should be polled now
+        """
+        if not self.adaptive:
+            return True
+        now = time.time() if now is None else now
+        # A minute of slack so a scheduler tick landing just early still polls it
+        return state.get('next_poll', 0) <= now + 60
+
+    def sla_deadline(self, state, sla_minutes=None):
+        """
+        Args:
+            state (dict): The site's SiteCache entry
+            sla_minutes (float): The site's own SLA, the policy's by default
+
+        Returns:
+            float: Unix time the site's feed becomes staler than its SLA,
+                None before its first successful crawl
+        """
+        if 'last_success' not in state:
+            return None
+        sla = sla_minutes * 60 if sla_minutes is not None else self.sla
+        if self.adaptive:
+            # A site is not expected to be fresher than it is polled, and the
+            # scheduler only looks for due sites every min_minutes
+            sla = max(sla, state.get('poll_interval', 0) + self.min_interval)
+        return state['last_success'] + sla
+
+    def typical_gap(self, times):
+        """
+        Mean gap between a site's recent entries.
+
+        Args:
+            times (list): Unix times of the newest entries (publication date,
+                or when first seen if the entry has no date)
+
+        Returns:
+            float: Seconds between two entries, None with less than two entries
+        """
+        if len(times) < 2:
+            return None
+        return (max(times) - min(times)) / (len(times) - 1)
+
+    def next_state(self, state, metrics, times, now=None):
+        """
+        Compute the interval and next poll time after a poll.
+
+        Args:
+            state (dict): The site's SiteCache entry
+            metrics (SiteMetrics): Outcome of the poll
+            times (list): Unix times of the site's newest entries
+            now (float): Unix time, time.time() by default
+
+        Returns:
+            dict: poll_interval and next_poll values for the SiteCache
+        """
+        now = time.time() if now is None else now
+        interval = state.get('poll_interval', self.min_interval)
+        if metrics.new_entries:
+            interval = self.min_interval
+        elif metrics.status != 'failed':
+            interval *= self.backoff
+
+        ceiling = self.max_interval
+        gap = self.typical_gap(times)
+        if gap is not None:
+            ceiling = min(ceiling, max(gap / 2, self.min_interval))
+        interval = min(max(interval, self.min_interval), ceiling)
+
+        if metrics.status == 'failed':
+            # Try again soon without forgetting the interval learned so far
+            return {'poll_interval': interval, 'next_poll': now + self.min_interval}
+        return {'poll_interval': interval, 'next_poll': now + interval}
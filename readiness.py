@@ -0,0 +1,76 @@
+# Resolves once the number of matches has not changed for stableMs milliseconds
+STABLE_SCRIPT = """
+({selector, stableMs}) => {
+    const count = document.querySelectorAll(selector).length;
+    const now = performance.now();
+    const state = window.__rssfeedgenStable || (window.__rssfeedgenStable = {count: -1, since: now});
+    if (count !== state.count) {
+        state.count = count;
+        state.since = now;
+        return false;
+    }
+    return count > 0 && now - state.since >= stableMs;
+}
+"""
+
+
+class Readiness:
+    strategies = ('networkidle', 'selector', 'stable', 'script')
+
+    def __init__(self, strategy='selector', stable_ms=500, script=None, timeout=60000):
+        """
+        Decide when a rendered page is ready to be extracted.
+
+        Strategies:
+            networkidle: wait for network idle, the container and one more second
+            selector: wait for DOMContentLoaded and a visible container
+            stable: like selector, then wait until the number of containers
+                has not changed for `stable_ms`
+            script: wait for DOMContentLoaded and a JS predicate to return true
+
+        Args:
+            strategy (str): One of Readiness.strategies
+            stable_ms (int): Quiet period of the stable strategy in milliseconds
+            script (str): JS function or expression for the script strategy
+            timeout (int): Timeout of every wait in milliseconds
+        """
+        if strategy not in Readiness.strategies:
+            raise ValueError(f"Unknown readiness strategy: {strategy}")
+        if strategy == 'script' and not script:
+            raise ValueError("The script readiness strategy needs a script")
+        self.strategy = strategy
+        self.stable_ms = stable_ms
+        self.script = script
+        self.timeout = timeout
+
+    @property
+    def wait_until(self):
+        """The page.goto wait_until matching the strategy."""
+        return 'networkidle' if self.strategy == 'networkidle' else 'domcontentloaded'
+
+    async def wait(self, page, container):
+        """
+        Wait until the page is ready.
+
+        Args:
+            page: The Playwright page, already navigated
+            container (str): CSS selector of the list entries
+        """
+        if self.strategy == 'script':
+            await page.wait_for_function(self.script, timeout=self.timeout)
+            return
+
+        await page.wait_for_selector(
+            f"{container} >> nth=0",
+            timeout=self.timeout,
+            state="visible"
+        )
+        if self.strategy == 'networkidle':
+            await page.wait_for_timeout(1000)
+        elif self.strategy == 'stable':
+            await page.wait_for_function(
+                STABLE_SCRIPT,
+                arg={'selector': container, 'stableMs': self.stable_ms},
+                polling=100,
+                timeout=self.timeout
+            )
@@ -0,0 +1,166 @@
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+CONTENT_TYPES = {
+    '.xml': 'application/rss+xml; charset=utf-8',
+    '.atom': 'application/atom+xml; charset=utf-8',
+    '.json': 'application/feed+json; charset=utf-8',
+}
+
+
+class Feed:
+    def __init__(self, body, content_type, modified=None):
+        """
+        A feed document held in memory, ready to be sent as is or gzipped.
+
+        Args:
+            body (bytes): The feed document
+            content_type (str): Value of the Content-Type header
+            modified (float): Unix time the document last changed
+        """
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self.content_type = content_type
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        # Each representation needs its own strong validator
+        self.gzip_etag = f'"{digest}-gzip"'
+        self.modified = int(modified if modified is not None else time.time())
+        self.last_modified = formatdate(self.modified, usegmt=True)
+
+
+class FeedServer:
+    def __init__(self, host='127.0.0.1', port=8080, max_age=300):
+        """
+        Serve the generated feeds over HTTP from memory.
+
+        Every feed is kept pre-rendered and pre-gzipped, so a request costs a
+        dictionary lookup and a write. Conditional requests with
+        If-None-Match or If-Modified-Since get a 304 while the feed is
+        unchanged.
+
+        Args:
+            host (str): Interface to listen on
+            port (int): Port to listen on
+            max_age (int): Seconds readers may cache a feed (Cache-Control)
+        """
+        self.host = host
+        self.port = port
+        self.max_age = max_age
+        self.feeds = {}
+        self.httpd = None
+
+    def publish(self, path, body, modified=None):
+        """
+        Serve a feed document at /<basename of path>, replacing the previous one.
+
+        Args:
+            path (str): Output path of the feed, its extension sets the content type
+            body (bytes): The feed document
+            modified (float): Unix time the document last changed
+        """
+        name = '/' + os.path.basename(path)
+        current = self.feeds.get(name)
+        if current is not None and current.body == body:
+            return
+        content_type = CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
+        # Swapped in one assignment, request threads see the old or the new feed
+        self.feeds[name] = Feed(body, content_type, modified)
+
+    def publish_file(self, path):
+        """Serve a feed file written to disk, if it exists."""
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+            modified = os.path.getmtime(path)
+        except OSError:
+            return
+        self.publish(path, body, modified)
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer((self.host, self.port), FeedHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.feed_server = self
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, name='feed-server', daemon=True).start()
+        logging.info(f"Serving feeds on http://{self.host}:{self.port}/")
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        feed = self.server.feed_server.feeds.get(urlsplit(self.path).path)
+        if feed is None:
+            self.send_error(404)
+            return
+
+        use_gzip = accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        etag = feed.gzip_etag if use_gzip else feed.etag
+        if self.not_modified(feed):
+            self.send_response(304)
+            self.send_validators(feed, etag)
+            self.end_headers()
+            return
+
+        body = feed.gzipped if use_gzip else feed.body
+        self.send_response(200)
+        self.send_header('Content-Type', feed.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_validators(feed, etag)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def not_modified(self, feed):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            # If-Modified-Since is ignored when If-None-Match is present (RFC 9110)
+            tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            return '*' in tags or feed.etag in tags or feed.gzip_etag in tags
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return feed.modified <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def send_validators(self, feed, etag):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', feed.last_modified)
+        self.send_header('Cache-Control', f'public, max-age={self.server.feed_server.max_age}')
+        self.send_header('Vary', 'Accept-Encoding')
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip."""
+    for coding in accept_encoding.lower().split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip() in ('gzip', 'x-gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
@@ -0,0 +1,55 @@
+import argparse
+import hashlib
+
+
+def parse_shard(value):
+    """
+    Parse a shard given as i/N on the command line.
+
+    Args:
+        value (str): e.g. 2/4 for the second of four shards
+
+    Returns:
+        tuple: (index, count), index counted from 1
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, e.g. 1/4, got {value}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def shard_of(url, count, salt=''):
+    """
+    Shard a site belongs to, from a hash of its URL.
+
+    The hash is stable across processes, machines and Python versions, unlike
+    hash(), so every node agrees on the split without coordination. Adding
+    or removing a site never moves the others.
+
+    Args:
+        url (str): The URL of the site
+        count (int): Number of shards
+        salt (str): Gives an independent split, to divide a shard further
+
+    Returns:
+        int: The shard, counted from 1
+    """
+    digest = hashlib.sha1(f"{salt}{url}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+def select(sites, index, count, salt=''):
+    """
+    Args:
+        sites: List of (RSS, Selector) tuples
+        index (int): The shard to keep, counted from 1
+        count (int): Number of shards
+        salt (str): As for shard_of
+
+    Returns:
+        list: The (RSS, Selector) tuples of the shard
+    """
+    return [(rss, selector) for rss, selector in sites if shard_of(rss.url, count, salt) == index]
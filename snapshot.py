@@ -0,0 +1,122 @@
+import base64
+import json
+import os
+from datetime import datetime, timezone
+from email.message import Message
+
+from fetch import Response
+from paths import site_filename
+
+MODES = ('off', 'record', 'replay')
+
+
+class Snapshots:
+    def __init__(self, mode='off', dir='snapshots'):
+        """
+        Record the network traffic of every crawl to HAR files, or replay it.
+
+        A static fetch is stored as a HAR with the single page response, a
+        rendered page as the HAR Chromium records for its context. Replaying
+        serves the page and everything the browser loaded from the file and
+        aborts any other request, so no request reaches the network. A replay
+        writes its feeds and metrics to `output_dir` and keeps its state in a
+        temporary directory, the live feeds and state are not touched.
+
+        Args:
+            mode (str): off, record or replay
+            dir (str): Directory of the HAR files, one per site
+        """
+        # An unquoted off in YAML is read as False
+        mode = mode or 'off'
+        if mode not in MODES:
+            raise ValueError(f"Unknown snapshot mode: {mode}")
+        self.mode = mode
+        self.dir = dir
+        self.output_dir = os.path.join(dir, 'replay')
+
+    @property
+    def recording(self):
+        return self.mode == 'record'
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def path(self, url):
+        """HAR file of a site, e.g. gdstc.gd.gov.cn_zwgk_n_tzgg_index.html-1a2b3c4d.har."""
+        return os.path.join(self.dir, site_filename(url, 'har'))
+
+    def context_options(self, url):
+        """Options of new_context that make Chromium record the site's HAR."""
+        if not self.recording:
+            return {}
+        os.makedirs(self.dir, exist_ok=True)
+        return {'record_har_path': self.path(url), 'record_har_content': 'embed'}
+
+    async def attach(self, context, url):
+        """Serve the requests of a replayed context from the site's HAR."""
+        if self.replaying:
+            await context.route_from_har(self.path(url), not_found='abort')
+
+    def save_response(self, url, response):
+        """Store a static response as a HAR with a single entry."""
+        headers = [{'name': name, 'value': value} for name, value in (response.headers or {}).items()]
+        content_type = response.headers.get('Content-Type', '') if response.headers else ''
+        har = {'log': {
+            'version': '1.2',
+            'creator': {'name': 'rssfeedgen', 'version': '1'},
+            'pages': [],
+            'entries': [{
+                'startedDateTime': datetime.now(timezone.utc).isoformat(),
+                'time': 0,
+                'request': {
+                    'method': 'GET', 'url': url, 'httpVersion': 'HTTP/1.1', 'cookies': [],
+                    'headers': [], 'queryString': [], 'headersSize': -1, 'bodySize': 0,
+                },
+                'response': {
+                    'status': response.status, 'statusText': '', 'httpVersion': 'HTTP/1.1',
+                    'cookies': [], 'headers': headers, 'redirectURL': '',
+                    'headersSize': -1, 'bodySize': len(response.body),
+                    'content': {
+                        'size': len(response.body),
+                        'mimeType': content_type,
+                        'text': base64.b64encode(response.body).decode('ascii'),
+                        'encoding': 'base64',
+                    },
+                },
+                'cache': {},
+                'timings': {'send': 0, 'wait': 0, 'receive': 0},
+            }],
+        }}
+        os.makedirs(self.dir, exist_ok=True)
+        path = self.path(url)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(har, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    def load_response(self, url):
+        """
+        The recorded response of a page, whether it was fetched or rendered.
+
+        Returns:
+            Response: The response stored for the URL
+        """
+        with open(self.path(url), 'r', encoding='utf-8') as f:
+            entries = json.load(f)['log']['entries']
+        for entry in entries:
+            if entry['request']['url'] == url:
+                response = entry['response']
+                content = response.get('content', {})
+                text = content.get('text', '')
+                headers = Message()
+                for header in response.get('headers', []):
+                    headers[header['name']] = header['value']
+                if content.get('encoding') == 'base64':
+                    body = base64.b64decode(text)
+                else:
+                    # Stored as decoded text, whatever the page's own charset was
+                    body = text.encode('utf-8')
+                    if headers.get('Content-Type'):
+                        headers.set_param('charset', 'utf-8')
+                return Response(url, response['status'], headers, body)
+        raise Exception(f"No response for {url} in {self.path(url)}")
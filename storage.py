@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+import time
+from urllib.parse import urlparse
+
+from paths import site_filename
+
+
+class StorageStates:
+    def __init__(self, enabled=True, dir='.cache/storage', max_age_hours=24):
+        """
+        Keep the cookies and localStorage of every site between runs.
+
+        A rendered page starts from the storage state its site had at the end
+        of the last successful render, so a WAF challenge or a cookie
+        redirect is only gone through once. Plain HTTP fetches send the saved
+        cookies too. A state older than `max_age_hours`, or whose cookies
+        have all expired, is not used and gets replaced by the next render.
+
+        Args:
+            enabled (bool): Keep storage states at all
+            dir (str): Directory of the storage state files, one per site
+            max_age_hours (float): Age after which a state is renewed
+        """
+        self.enabled = enabled
+        self.dir = dir
+        self.max_age = max_age_hours * 3600
+
+    def path(self, url):
+        """Storage state file of a site, e.g. www.hp.gov.cn_gzhpkj_gkmlpt_index-1a2b3c4d.json."""
+        return os.path.join(self.dir, site_filename(url, 'json'))
+
+    def load(self, url):
+        """
+        Returns:
+            dict: The site's storage state, None when it has none or it expired
+        """
+        if not self.enabled:
+            return None
+        path = self.path(url)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        cookies = state.get('cookies', [])
+        # Session cookies have no expiry (-1), the state is only as old as max_age
+        if cookies and all(0 <= cookie.get('expires', -1) < now for cookie in cookies):
+            return None
+        return state
+
+    def context_options(self, url):
+        """Options of new_context that start it from the site's storage state."""
+        state = self.load(url)
+        return {'storage_state': state} if state else {}
+
+    async def save(self, context, url):
+        """Store the cookies and localStorage of a context after a successful render."""
+        if not self.enabled:
+            return
+        try:
+            state = await context.storage_state()
+            os.makedirs(self.dir, exist_ok=True)
+            path = self.path(url)
+            with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(f"{path}.tmp", path)
+        except Exception as e:
+            logging.warning(f"Failed to save the storage state of {url}: {str(e)}")
+
+    def forget(self, url):
+        """Drop a site's storage state, e.g. when the site rejected it."""
+        try:
+            os.remove(self.path(url))
+        except OSError:
+            pass
+
+    def cookie_header(self, site_url, url):
+        """
+        Cookie header for a plain HTTP request of a site, from its storage state.
+
+        Args:
+            site_url (str): The URL of the site the state belongs to
+            url (str): The URL being requested
+
+        Returns:
+            str: Value of the Cookie header, None when no cookie applies
+        """
+        state = self.load(site_url)
+        if not state:
+            return None
+        parsed = urlparse(url)
+        host = (parsed.hostname or '').lower()
+        path = parsed.path or '/'
+        now = time.time()
+        cookies = []
+        for cookie in state.get('cookies', []):
+            domain = cookie.get('domain', '').lower()
+            if domain.startswith('.'):
+                if host != domain[1:] and not host.endswith(domain):
+                    continue
+            elif host != domain:
+                continue
+            if not path.startswith(cookie.get('path', '/')):
+                continue
+            if cookie.get('secure') and parsed.scheme != 'https':
+                continue
+            if 0 <= cookie.get('expires', -1) < now:
+                continue
+            cookies.append(f"{cookie['name']}={cookie['value']}")
+        return '; '.join(cookies) or None
@@ -0,0 +1,194 @@
+import os
+import sqlite3
+import time
+from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    site TEXT NOT NULL,
+    link_key TEXT NOT NULL,
+    link TEXT NOT NULL,
+    title TEXT NOT NULL,
+    published TEXT,
+    sort_ts INTEGER NOT NULL,
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    PRIMARY KEY (site, link_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_site_sort ON entries (site, sort_ts, first_seen);
+-- Left over from earlier versions, nothing queries entries by first_seen alone
+DROP INDEX IF EXISTS entries_site_first_seen;
+CREATE TABLE IF NOT EXISTS articles (
+    link_key TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    fetched INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Stay well below SQLITE_MAX_VARIABLE_NUMBER
+BATCH_SIZE = 500
+
+
+def normalize_link(link):
+    """Key identifying a link: lower-case scheme and host, no default port or fragment."""
+    parts = urlsplit(link.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme, parts.port) in (('http', 80), ('https', 443)):
+        netloc = netloc.rsplit(':', 1)[0]
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+class EntryStore:
+    def __init__(self, path):
+        """
+        Initialize the SQLite store holding every entry ever seen per site.
+
+        Entries are keyed by site URL and normalized link, so an entry is
+        stored once however often it is crawled.
+
+        Args:
+            path (str): The SQLite database file
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def upsert(self, site, entries):
+        """
+        Insert new entries of a site and refresh the ones already stored.
+
+        Args:
+            site (str): The site URL
+            entries (list): (date, title, link) tuples
+
+        Returns:
+            list: The (date, title, link) tuples that were not stored before
+        """
+        now = int(time.time())
+        rows = {}
+        for date, title, link in entries:
+            rows[normalize_link(link)] = (date, title, link)
+
+        known = self.known(site, rows)
+        new = [entry for key, entry in rows.items() if key not in known]
+
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO entries (site, link_key, link, title, published, sort_ts, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (site, link_key) DO UPDATE SET
+                    link = excluded.link,
+                    title = excluded.title,
+                    published = COALESCE(excluded.published, entries.published),
+                    sort_ts = CASE WHEN excluded.published IS NULL THEN entries.sort_ts ELSE excluded.sort_ts END,
+                    last_seen = excluded.last_seen
+                """,
+                [
+                    (site, key, link, title,
+                     date.isoformat() if date else None,
+                     int(date.timestamp()) if date else now,
+                     now, now)
+                    for key, (date, title, link) in rows.items()
+                ]
+            )
+        return new
+
+    def known(self, site, link_keys):
+        """
+        Args:
+            site (str): The site URL
+            link_keys: Normalized links to look up
+
+        Returns:
+            set: The link keys already stored for the site
+        """
+        link_keys = list(link_keys)
+        found = set()
+        for i in range(0, len(link_keys), BATCH_SIZE):
+            batch = link_keys[i:i + BATCH_SIZE]
+            cursor = self.conn.execute(
+                f"SELECT link_key FROM entries WHERE site = ? AND link_key IN ({','.join('?' * len(batch))})",
+                [site, *batch]
+            )
+            found.update(row[0] for row in cursor)
+        return found
+
+    def latest(self, site, limit=None):
+        """
+        Args:
+            site (str): The site URL
+            limit (int): Maximum number of entries, all when None
+
+        Returns:
+            list: (date, title, link) tuples, newest first. Entries without a
+                date are ordered by when they were first seen.
+        """
+        cursor = self.conn.execute(
+            "SELECT published, title, link FROM entries WHERE site = ? ORDER BY sort_ts DESC, first_seen DESC LIMIT ?",
+            (site, -1 if limit is None else limit)
+        )
+        return [self._entry(row) for row in cursor]
+
+    def articles(self, links):
+        """
+        Args:
+            links: Links of the articles to look up
+
+        Returns:
+            dict: Normalized link to the cached article body, for the links
+                whose body was fetched before
+        """
+        link_keys = list({normalize_link(link) for link in links})
+        found = {}
+        for i in range(0, len(link_keys), BATCH_SIZE):
+            batch = link_keys[i:i + BATCH_SIZE]
+            cursor = self.conn.execute(
+                f"SELECT link_key, content FROM articles WHERE link_key IN ({','.join('?' * len(batch))})",
+                batch
+            )
+            found.update(cursor)
+        return found
+
+    def save_articles(self, contents):
+        """
+        Cache article bodies, an article is shared by every site linking to it.
+
+        Args:
+            contents (dict): Link to the HTML of the article body
+        """
+        now = int(time.time())
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO articles (link_key, content, fetched) VALUES (?, ?, ?)",
+                [(normalize_link(link), content, now) for link, content in contents.items()]
+            )
+
+    def recent_times(self, site, limit):
+        """
+        Args:
+            site (str): The site URL
+            limit (int): Maximum number of entries
+
+        Returns:
+            list: Unix times of the newest entries, their publication date or
+                when they were first seen if they have none
+        """
+        cursor = self.conn.execute(
+            "SELECT sort_ts FROM entries WHERE site = ? ORDER BY sort_ts DESC, first_seen DESC LIMIT ?",
+            (site, limit)
+        )
+        return [row[0] for row in cursor]
+
+    @staticmethod
+    def _entry(row):
+        published, title, link = row
+        return (datetime.fromisoformat(published) if published else None, title, link)